@@ -8,6 +8,7 @@ $appVersion = python -c "from ztraining2strigo import VERSION; print(VERSION, en
 python -m nuitka `
     --onefile --windows-onefile-tempdir `
     --assume-yes-for-downloads `
+    --include-package-data=strigo.configs `
     --windows-company-name=zenika --windows-product-name=ztraining2strigo `
     --windows-file-version=$appVersion --windows-product-version=$appVersion `
     --output-dir=../build `
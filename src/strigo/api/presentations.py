@@ -26,8 +26,10 @@ def delete(client: Client, class_id: str, presentation_id: str) -> None:
 
 
 def update(client: Client, class_id: str, presentation_id: str, presentation: Path) -> Presentation:
+    # Uploaded first so that the class is never left without the presentation
+    created = create(client, class_id, presentation)
     delete(client, class_id, presentation_id)
-    return create(client, class_id, presentation)
+    return created
 
 
 def get_notes(client: Client, class_id: str, presentation_id: str) -> List[Note]:
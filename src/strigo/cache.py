@@ -0,0 +1,128 @@
+# coding: utf8
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def cache_dir() -> Path:
+    """Root directory of ztraining2strigo caches, `Z2S_CACHE_DIR` or the user cache directory"""
+    if os.environ.get('Z2S_CACHE_DIR', None):
+        return Path(os.environ['Z2S_CACHE_DIR'])
+    if os.name == 'nt' and os.environ.get('LOCALAPPDATA', None):
+        return Path(os.environ['LOCALAPPDATA']) / 'ztraining2strigo' / 'cache'
+    return Path(os.environ.get('XDG_CACHE_HOME', None) or Path.home() / '.cache') / 'ztraining2strigo'
+
+
+def write_atomically(path: Path, content: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        mode = path.stat().st_mode & 0o7777
+    except FileNotFoundError:
+        mode = 0o666 & ~_UMASK  # As a file created by open()
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+@dataclass
+class CachedResponse:
+    path: str
+    body: str
+    stored_at: float
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    @property
+    def has_validators(self) -> bool:
+        return bool(self.etag or self.last_modified)
+
+    def conditional_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @staticmethod
+    def from_dict(d: Dict[str, Any]) -> CachedResponse:
+        return CachedResponse(**d)
+
+
+class ResponseCache:
+    """Cache of GET responses, revalidated with their ETag/Last-Modified, or served until `ttl` seconds without validators.
+
+    Responses are stored on disk in `directory`, or in memory without it (for a long-running process).
+    """
+
+    def __init__(self, directory: Optional[Path], namespace: str, ttl: float = 0) -> None:
+        self._directory = directory
+        self._namespace = namespace  # Responses depend on the organization
+        self.ttl = ttl
+        self._memory: Dict[str, CachedResponse] = {}
+
+    def _key(self, path: str) -> str:
+        return hashlib.sha256(f"{self._namespace}\n{path}".encode('utf-8')).hexdigest()
+
+    def _file(self, key: str) -> Path:
+        return self._directory / key[:2] / f"{key}.json"
+
+    def get(self, path: str) -> Optional[CachedResponse]:
+        if self._directory is None:
+            return self._memory.get(self._key(path))
+        try:
+            with self._file(self._key(path)).open() as f:
+                return CachedResponse.from_dict(json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def is_fresh(self, cached: CachedResponse) -> bool:
+        return not cached.has_validators and time.time() - cached.stored_at < self.ttl
+
+    def put(self, cached: CachedResponse) -> None:
+        if not cached.has_validators and not self.ttl:
+            return  # Could never be used
+        if self._directory is None:
+            self._memory[self._key(cached.path)] = cached
+        else:
+            write_atomically(self._file(self._key(cached.path)), json.dumps(cached.to_dict()).encode('utf-8'))
+
+    def invalidate(self, path: str) -> None:
+        """Forget the responses of the path and its parents, which embed it (e.g. the class embeds its resources)"""
+        parts = path.split('?')[0].rstrip('/').split('/')
+        for i in range(2, len(parts) + 1):
+            key = self._key('/'.join(parts[:i]))
+            if self._directory is None:
+                self._memory.pop(key, None)
+                continue
+            try:
+                self._file(key).unlink()
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def from_environment(namespace: str) -> Optional[ResponseCache]:
+        """The cache configured by the environment variables `Z2S_HTTP_CACHE` and `Z2S_HTTP_CACHE_TTL`"""
+        ttl = float(os.environ.get('Z2S_HTTP_CACHE_TTL', None) or 0)
+        if not ttl and os.environ.get('Z2S_HTTP_CACHE', '').lower() not in ('1', 'true'):
+            return None
+        return ResponseCache(cache_dir() / 'http', hashlib.sha256(namespace.encode('utf-8')).hexdigest(), ttl)
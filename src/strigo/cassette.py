@@ -0,0 +1,185 @@
+# coding: utf8
+from __future__ import annotations
+
+import atexit
+import base64
+import hashlib
+import http.client
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from dataclasses import asdict, dataclass, field
+from functools import cache
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple, Union
+
+CASSETTE_FORMAT_VERSION = 1
+
+_Key = Tuple[str, str, str, Optional[str]]
+
+
+@dataclass
+class Interaction:
+    host: str
+    method: str
+    url: str
+    body_sha256: Optional[str]  # Only for JSON bodies, multipart ones have random boundaries
+    status: int
+    reason: str
+    headers: List[Tuple[str, str]] = field(default_factory=list)
+    body: str = ''
+    body_base64: bool = False
+    latency: float = 0.0
+
+    @property
+    def key(self) -> _Key:
+        return self.host, self.method, self.url, self.body_sha256
+
+    @property
+    def raw_body(self) -> bytes:
+        return base64.b64decode(self.body) if self.body_base64 else self.body.encode('utf-8')
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @staticmethod
+    def from_dict(d: Dict[str, Any]) -> Interaction:
+        d['headers'] = [tuple(h) for h in d['headers']]
+        return Interaction(**d)
+
+
+def _body_hash(body: Union[bytes, str, Iterable[bytes], None]) -> Tuple[Optional[bytes], Optional[str]]:
+    if body is None:
+        return None, None
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+        return body, hashlib.sha256(body).hexdigest()
+    if not isinstance(body, bytes):
+        body = b''.join(body)
+    return body, None
+
+
+class _CassetteResponse:
+    """Enough of `http.client.HTTPResponse` for the clients"""
+
+    def __init__(self, interaction: Interaction) -> None:
+        self.status = interaction.status
+        self.reason = interaction.reason
+        self.headers = http.client.HTTPMessage()
+        for name, value in interaction.headers:
+            self.headers[name] = value
+        self._body = interaction.raw_body
+
+    def getheader(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        return self.headers.get(name, default)
+
+    def read(self) -> bytes:
+        body, self._body = self._body, b''
+        return body
+
+
+class _CassetteConnection:
+    """Connection recording the exchanges of a real connection, or replaying them without network"""
+
+    def __init__(self, cassette: Cassette, host: str, connection: Optional[http.client.HTTPConnection]) -> None:
+        self._cassette = cassette
+        self._host = host
+        self._connection = connection
+        self._pending: Optional[Tuple[_Key, float]] = None
+        self.sock = None
+        self.debuglevel = 0
+
+    def set_debuglevel(self, level: int) -> None:
+        self.debuglevel = level
+        if self._connection:
+            self._connection.set_debuglevel(level)
+
+    def connect(self) -> None:
+        if self._connection:
+            self._connection.connect()
+
+    def close(self) -> None:
+        if self._connection:
+            self._connection.close()
+
+    def request(self, method: str, url: str, body: Union[bytes, str, Iterable[bytes], None] = None, headers: Dict[str, str] = {}) -> None:
+        body, body_sha256 = _body_hash(body)
+        self._pending = ((self._host, method, url, body_sha256), time.perf_counter())
+        if self._connection:
+            self._connection.request(method, url, body=body, headers=headers)
+            self.sock = self._connection.sock
+
+    def getresponse(self) -> _CassetteResponse:
+        key, start = self._pending
+        if self._connection is None:
+            return _CassetteResponse(self._cassette.replay(key))
+        response = self._connection.getresponse()
+        raw_data = response.read()
+        try:
+            body, body_base64 = raw_data.decode('utf-8'), False
+        except UnicodeDecodeError:
+            body, body_base64 = base64.b64encode(raw_data).decode('ascii'), True
+        interaction = Interaction(*key, response.status, response.reason, list(response.headers.items()), body, body_base64, time.perf_counter() - start)
+        self._cassette.record(interaction)
+        self.sock = self._connection.sock
+        return _CassetteResponse(interaction)
+
+
+class Cassette:
+
+    def __init__(self, path: Path, mode: str = 'replay', replay_latency: bool = False) -> None:
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.replay_latency = replay_latency
+        self._lock = threading.Lock()
+        self._interactions: List[Interaction] = []
+        self._queues: Dict[_Key, Deque[Interaction]] = defaultdict(deque)
+        if mode == 'replay':
+            with path.open() as f:
+                data = json.load(f)
+            if data.get('version') != CASSETTE_FORMAT_VERSION:
+                raise Exception(f"Unsupported cassette version: {data.get('version')}")
+            for interaction in (Interaction.from_dict(i) for i in data['interactions']):
+                self._queues[interaction.key].append(interaction)
+
+    def connection(self, host: str, new_connection: Callable[[], http.client.HTTPConnection]) -> _CassetteConnection:
+        return _CassetteConnection(self, host, new_connection() if self.mode == 'record' else None)
+
+    def record(self, interaction: Interaction) -> None:
+        with self._lock:
+            self._interactions.append(interaction)
+
+    def replay(self, key: _Key) -> Interaction:
+        with self._lock:
+            queue = self._queues.get(key)
+            if not queue:
+                host, method, url, _ = key
+                raise Exception(f"No recorded response left in cassette '{self.path}' for {method} {host}{url}")
+            # Repeated requests are served in recorded order, the last response is kept for further ones
+            interaction = queue.popleft() if len(queue) > 1 else queue[0]
+        if self.replay_latency:
+            time.sleep(interaction.latency)
+        return interaction
+
+    def save(self) -> None:
+        with self._lock:
+            interactions = [i.to_dict() for i in self._interactions]
+        with self.path.open('w') as f:
+            json.dump({'version': CASSETTE_FORMAT_VERSION, 'interactions': interactions}, f, indent=2)
+            f.write('\n')
+
+
+@cache
+def active_cassette() -> Optional[Cassette]:
+    """The cassette configured by the environment variables `Z2S_CASSETTE`, `Z2S_CASSETTE_MODE` and `Z2S_CASSETTE_LATENCY`"""
+    path = os.environ.get('Z2S_CASSETTE', None)
+    if not path:
+        return None
+    cassette = Cassette(Path(path), os.environ.get('Z2S_CASSETTE_MODE', 'replay'), os.environ.get('Z2S_CASSETTE_LATENCY', '').lower() in ('1', 'true'))
+    if cassette.mode == 'record':
+        atexit.register(cassette.save)
+    return cassette
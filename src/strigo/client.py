@@ -3,29 +3,53 @@ from __future__ import annotations
 
 import http.client
 import json
-import os
+import threading
+import time
 import uuid
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Dict, List, Type, TypeVar, Union
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Type, TypeVar, Union
 from urllib.parse import urlparse
 
+from .cache import CachedResponse, ResponseCache
+from . import deadline
+from .connections import Timeouts, apply_timeouts, new_connection
 from .models.errors import Error, RequestValidationError
+from .profiling import phase
+from .scheduler import EndpointStats, RequestScheduler
 
 _T = TypeVar('_T')
 
+STRIGO_ENDPOINT = 'https://app.strigo.io/api/v1'
+
 
 class Client:
 
-    def __init__(self, organization_id: str, api_key: str, strigo_endpoint: str = 'https://app.strigo.io/api/v1') -> None:
-        parse_result = urlparse(strigo_endpoint)
-        if parse_result.scheme == 'https':
-            self._connection = http.client.HTTPSConnection(parse_result.hostname, parse_result.port)
-        else:
-            self._connection = http.client.HTTPConnection(parse_result.hostname, parse_result.port)
-        if bool(os.environ.get('Z2S_TRACE_HTTP', False)):
-            self._connection.set_debuglevel(1)
-        self._path = parse_result.path
+    def __init__(self, organization_id: str, api_key: str, strigo_endpoint: str = STRIGO_ENDPOINT, response_cache: Optional[ResponseCache] = None, scheduler: Optional[RequestScheduler] = None, timeouts: Timeouts = Timeouts()) -> None:
+        self._endpoint = urlparse(strigo_endpoint)
+        self._path = self._endpoint.path
         self._token = f"{organization_id}:{api_key}"
+        self._idle_connections: List[http.client.HTTPConnection] = []
+        self._connections_lock = threading.Lock()
+        self._debuglevel = 0
+        self._cache = response_cache
+        self._scheduler = scheduler or RequestScheduler()
+        self._timeouts = timeouts
+
+    @contextmanager
+    def _connection(self) -> Iterator[http.client.HTTPConnection]:
+        # One connection per concurrent request, idle ones are kept for the next requests of any thread,
+        # so that short-lived workers (e.g. of each sync) reuse warm connections
+        with self._connections_lock:
+            connection = self._idle_connections.pop() if self._idle_connections else None
+        if connection is None:
+            connection = new_connection(self._endpoint.scheme, self._endpoint.hostname, self._endpoint.port, self._timeouts)
+            self._debuglevel = connection.debuglevel
+        try:
+            yield connection
+        finally:
+            with self._connections_lock:
+                self._idle_connections.append(connection)
 
     def _headers(self):
         return {
@@ -34,45 +58,93 @@ class Client:
             'Content-Type': 'application/json'
         }
 
+    def _request(self, method: str, path: str, body: Union[bytes, str, Callable[[], Iterable[bytes]], None] = None, headers: Dict[str, str] = None, latency_signal: bool = True) -> Tuple[http.client.HTTPResponse, bytes]:
+        with phase(f"http {method}"):
+            try:
+                return self._scheduler.run(method, path, lambda: self._send(method, path, body, headers), latency_signal)
+            except TimeoutError:
+                raise Error(type='Timeout', message=f"{method} {path}: timed out") from None
+
+    def stats(self) -> Dict[str, EndpointStats]:
+        """Statistics of the requests sent by the client, per endpoint"""
+        return self._scheduler.stats()
+
+    def _send(self, method: str, path: str, body: Union[bytes, str, Callable[[], Iterable[bytes]], None], headers: Dict[str, str]) -> Tuple[http.client.HTTPResponse, bytes]:
+        current_deadline = deadline.current()
+        if current_deadline:
+            current_deadline.check(f"{method} {path}")
+        with self._connection() as connection:
+            apply_timeouts(connection, self._timeouts)
+            # The connection is kept alive between requests, reconnect once if the server closed it meanwhile
+            reused = connection.sock is not None
+            try:
+                try:
+                    connection.request(method, f"{self._path}{path}", body=body() if callable(body) else body, headers=headers or self._headers())
+                    response = connection.getresponse()
+                except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                    connection.close()
+                    if not reused:
+                        raise
+                    connection.request(method, f"{self._path}{path}", body=body() if callable(body) else body, headers=headers or self._headers())
+                    response = connection.getresponse()
+                return response, response.read()
+            except (OSError, http.client.HTTPException):
+                connection.close()  # Left in an unknown state, the request may be retried on a new one
+                raise
+
     def get(self, path: str, cls: Type[_T]) -> Union[_T, List[_T]]:
-        self._connection.connect()
-        self._connection.request('GET', f"{self._path}{path}", headers=self._headers())
-        response = self._connection.getresponse()
-        raw_data = response.read()
+        if self._cache:
+            return self._cached_get(path, cls)
+
+        response, raw_data = self._request('GET', path)
 
         self._handle_raw_error(response, raw_data)
 
         return self._parse_result(response, raw_data, cls)
 
+    def _cached_get(self, path: str, cls: Type[_T]) -> Union[_T, List[_T]]:
+        cached = self._cache.get(path)
+        if cached and self._cache.is_fresh(cached):
+            return self._parse_data(http.client.OK, json.loads(cached.body), cls)
+
+        headers = self._headers()
+        if cached:
+            headers.update(cached.conditional_headers())
+        response, raw_data = self._request('GET', path, headers=headers)
+        if cached and response.status == http.client.NOT_MODIFIED:
+            return self._parse_data(http.client.OK, json.loads(cached.body), cls)
+
+        self._handle_raw_error(response, raw_data)
+
+        result = self._parse_result(response, raw_data, cls)
+        if response.status == http.client.OK:
+            self._cache.put(CachedResponse(path, raw_data.decode(response.headers.get_content_charset() or 'utf-8'), time.time(), response.getheader('ETag'), response.getheader('Last-Modified')))
+        return result
+
     def post(self, path, data: Dict[str, Any], cls: Type[_T]) -> _T:
-        self._connection.connect()
-        body = json.dumps(data)
-        self._connection.request('POST', f"{self._path}{path}", body=body, headers=self._headers())
-        response = self._connection.getresponse()
-        raw_data = response.read()
+        response, raw_data = self._request('POST', path, body=json.dumps(data))
+        if self._cache:
+            self._cache.invalidate(path)
 
         self._handle_raw_error(response, raw_data)
 
         return self._parse_result(response, raw_data, cls)
 
     def patch(self, path, data: Dict[str, Any], cls: Type[_T]) -> _T:
-        self._connection.connect()
-        body = json.dumps(data)
-        self._connection.request('PATCH', f"{self._path}{path}", body=body, headers=self._headers())
-        response = self._connection.getresponse()
-        raw_data = response.read()
+        response, raw_data = self._request('PATCH', path, body=json.dumps(data))
+        if self._cache:
+            self._cache.invalidate(path)
 
         self._handle_raw_error(response, raw_data)
 
         return self._parse_result(response, raw_data, cls)
 
     def upload(self, path, data: Dict[str, Path], cls: Type[_T]) -> _T:
-        self._connection.connect()
         headers = self._headers()
         boundary = uuid.uuid4().hex
         headers['Content-Type'] = f"multipart/form-data; boundary={boundary}"
 
-        def body() -> bytes:
+        def body() -> Iterator[bytes]:
             for name, filepath in data.items():
                 yield f"\r\n--{boundary}\r\n".encode('ascii')
                 yield f"Content-Disposition: form-data; name=\"{name}\"; filename=\"{filepath.name}\"\r\n".encode('ascii')
@@ -83,24 +155,24 @@ class Client:
                         yield chunk
             yield f"\r\n--{boundary}--".encode('ascii')
 
-        self._connection.request('POST', f"{self._path}{path}", body=body(), headers=headers)
-        response = self._connection.getresponse()
-        raw_data = response.read()
+        # The duration of an upload depends on the size of the file, not on the load of the server
+        response, raw_data = self._request('POST', path, body=body, headers=headers, latency_signal=False)
+        if self._cache:
+            self._cache.invalidate(path)
 
         self._handle_raw_error(response, raw_data)
 
         return self._parse_result(response, raw_data, cls)
 
     def delete(self, path) -> None:
-        self._connection.connect()
-        self._connection.request('DELETE', f"{self._path}{path}", headers=self._headers())
-        response = self._connection.getresponse()
-        raw_data = response.read()
+        response, raw_data = self._request('DELETE', path)
+        if self._cache:
+            self._cache.invalidate(path)
 
         self._handle_raw_error(response, raw_data, [http.client.NO_CONTENT])
 
     def _handle_raw_error(self, response: http.client.HTTPResponse, raw_data: bytes, expected_statuses: List[int] = [http.client.OK, http.client.UNPROCESSABLE_ENTITY]) -> None:
-        if self._connection.debuglevel > 0:
+        if self._debuglevel > 0:
             print("reply:", repr(raw_data))
         try:
             data = json.loads(raw_data)
@@ -117,15 +189,16 @@ class Client:
             raise Error(type='HTTPError', message=message)
 
     def _parse_result(self, response: http.client.HTTPResponse, raw_data: bytes, cls: Type[_T]) -> _T:
-        data = json.loads(raw_data)
+        return self._parse_data(response.status, json.loads(raw_data), cls)
 
+    def _parse_data(self, status: int, data: Dict[str, Any], cls: Type[_T]) -> _T:
         if data['result'] == 'success':
             if isinstance(data['data'], list):
                 return [cls.from_dict(e) for e in data['data']]
             else:
                 return cls.from_dict(data['data'])
         elif data['result'] == 'failure':
-            if response.status == http.client.UNPROCESSABLE_ENTITY:
+            if status == http.client.UNPROCESSABLE_ENTITY:
                 raise RequestValidationError.from_dict(data['error'])
             else:
                 raise Error.from_dict(data['error'])
@@ -1,7 +1,12 @@
 # coding: utf8
 from __future__ import annotations
 
+import os
+import threading
 from pathlib import Path
+from typing import List
+
+from ..cache import write_atomically
 
 
 def bootstrap_config_file(config_path: Path, check_not_exists: bool = True) -> Path:
@@ -12,7 +17,40 @@ def bootstrap_config_file(config_path: Path, check_not_exists: bool = True) -> P
     return config_path
 
 
-def get_scripts_folder() -> Path:
-    scripts_folder = Path('.') / 'Installation' / 'strigo'
+def get_scripts_folder(root: Path = Path('.')) -> Path:
+    scripts_folder = root / 'Installation' / 'strigo'
     scripts_folder.mkdir(parents=True, exist_ok=True)
     return scripts_folder
+
+
+class FileChanges:
+    """Text files written only when their content changed, and the record of the changes"""
+
+    def __init__(self) -> None:
+        self.created: List[Path] = []
+        self.updated: List[Path] = []
+        self.unchanged: List[Path] = []
+        self._lock = threading.Lock()
+
+    def write(self, path: Path, content: str) -> None:
+        data = content.replace('\n', os.linesep).encode('utf-8')  # As in text mode
+        try:
+            # Compare sizes first, most changed files have a different size
+            existing = path.read_bytes() if path.stat().st_size == len(data) else None
+        except FileNotFoundError:
+            changes = self.created
+        else:
+            changes = self.unchanged if existing == data else self.updated
+        if changes is not self.unchanged:
+            write_atomically(path, data)
+        with self._lock:
+            changes.append(path)
+
+    def extend(self, other: FileChanges) -> None:
+        with self._lock:
+            self.created.extend(other.created)
+            self.updated.extend(other.updated)
+            self.unchanged.extend(other.unchanged)
+
+    def summary(self) -> str:
+        return f"{len(self.created)} created, {len(self.updated)} updated, {len(self.unchanged)} unchanged"
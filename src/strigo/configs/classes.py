@@ -9,14 +9,29 @@ from typing import Any, Dict, List, Optional
 
 from ..models.classes import Class
 from ..models.presentations import Presentation
-from .presentations import PresentationConfig
+from ..profiling import phase
+from . import FileChanges
+from .files import FileIndex
+from .presentations import PresentationConfig, duplicate_file_names
 from .resources import ResourceConfig
+from .snapshots import ConfigSnapshots, file_sha256
 
 _CONFIG_BASE = {
   "$schema": "https://raw.githubusercontent.com/Zenika-Training/ztraining2strigo/main/strigo.schema.json"
 }
 
 
+def load_raw_config(config_path: Path) -> Dict[str, Any]:
+    with config_path.open('rb') as f:
+        match config_path.suffix:
+            case '.json':
+                return json.load(f)
+            case '.toml':
+                return tomllib.load(f)
+            case _:
+                raise Exception(f"Format unsupported for config file '{config_path.absolute()}'")
+
+
 @dataclass
 class ClassConfig:
     name: str
@@ -26,45 +41,49 @@ class ClassConfig:
     presentations: List[PresentationConfig] = field(default_factory=list)
     resources: List[ResourceConfig] = field(default_factory=list)
 
-    def write(self, config_path: Path) -> None:
-        with config_path.open('w') as f:
-            json.dump({**_CONFIG_BASE, **asdict(self)}, f, indent=2)
-            f.write('\n')
+    def write(self, config_path: Path, changes: Optional[FileChanges] = None) -> None:
+        config = {**_CONFIG_BASE, **asdict(self), 'resources': [r.to_dict() for r in self.resources]}
+        (changes or FileChanges()).write(config_path, json.dumps(config, indent=2) + '\n')
 
     @property
     def strigo_description(self) -> str:
         return '\n'.join(self.description)
 
     @staticmethod
-    def load(config_path: Path) -> ClassConfig:
-        with config_path.open('rb') as f:
-            match config_path.suffix:
-                case '.json':
-                    raw_config = json.load(f)
-                case '.toml':
-                    raw_config = tomllib.load(f)
-                case _:
-                    raise Exception(f"Format unsupported for config file '{config_path.absolute()}'")
-        raw_config.pop('$schema', None)
-        return ClassConfig.from_dict(raw_config)
+    def load(config_path: Path, snapshots: Optional[ConfigSnapshots] = None) -> ClassConfig:
+        with phase('config load'):
+            if snapshots:
+                config_sha256 = file_sha256(config_path)
+                config = snapshots.get(config_path, config_sha256)
+                if config:
+                    return config
+            raw_config = load_raw_config(config_path)
+            raw_config.pop('$schema', None)
+            config = ClassConfig.from_dict(raw_config)
+            if snapshots:
+                snapshots.put(config_path, config_sha256, config)
+            return config
 
     @staticmethod
     def from_dict(d: Dict[str, Any]) -> ClassConfig:
-        if isinstance(d['description'], str):
+        if isinstance(d.get('description'), str):
             d['description'] = d['description'].split('\n')
-        if len(d['presentations']) != 1:
-            raise Exception('Presentations list must have exactly 1 element')
+        duplicates = duplicate_file_names([p['file'] for p in d['presentations']])
+        if duplicates:
+            raise Exception(f"Presentations must have distinct file names, Strigo identifies them by file name: {', '.join(duplicates)}")
         d['presentations'] = [PresentationConfig.from_dict(e) for e in d['presentations']]
         d['resources'] = [ResourceConfig.from_dict(e) for e in d['resources']]
         return ClassConfig(**d)
 
     @staticmethod
-    def from_strigo(cls: Class, presentations: List[Presentation]) -> ClassConfig:
+    def from_strigo(cls: Class, presentations: List[Presentation], root: Path = Path('.'), index: Optional[FileIndex] = None, changes: Optional[FileChanges] = None) -> ClassConfig:
+        if presentations and index is None:
+            index = FileIndex(root)  # Shared by the lookups of all the presentations
         return ClassConfig(
             id=cls.id,
             name=cls.name,
             description=cls.str_description.split('\n'),
             labels=cls.labels,
-            presentations=[PresentationConfig.from_strigo(p) for p in presentations],
-            resources=[ResourceConfig.from_strigo(r) for r in cls.resources]
+            presentations=[PresentationConfig.from_strigo(p, root, index) for p in presentations],
+            resources=[ResourceConfig.from_strigo(r, root, changes) for r in cls.resources]
         )
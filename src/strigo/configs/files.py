@@ -0,0 +1,121 @@
+# coding: utf8
+from __future__ import annotations
+
+import os
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_IGNORES = ('.git', 'node_modules')
+
+# (base directory relative to the index root, regex, negated, directories only)
+_Rule = Tuple[str, re.Pattern, bool, bool]
+
+
+def _translate(pattern: str) -> str:
+    regex = ''
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            regex += '(?:.*/)?'
+            i += 3
+        elif pattern.startswith('**', i):
+            regex += '.*'
+            i += 2
+        elif pattern[i] == '*':
+            regex += '[^/]*'
+            i += 1
+        elif pattern[i] == '?':
+            regex += '[^/]'
+            i += 1
+        elif pattern[i] == '[' and ']' in pattern[i + 2:]:
+            end = pattern.index(']', i + 2)
+            characters = pattern[i + 1:end]
+            if characters.startswith('!'):
+                characters = '^' + characters[1:]
+            regex += '[' + characters.replace('\\', '\\\\') + ']'
+            i = end + 1
+        elif pattern[i] == '\\' and i + 1 < len(pattern):
+            regex += re.escape(pattern[i + 1])
+            i += 2
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+    return regex
+
+
+def parse_ignore_patterns(lines: Iterable[str], base: str = '') -> List[_Rule]:
+    """Rules of gitignore patterns, relative to the `base` directory"""
+    rules = []
+    for line in lines:
+        pattern = line.rstrip('\n').rstrip(' ')
+        if not pattern or pattern.startswith('#'):
+            continue
+        negated = pattern.startswith('!')
+        if negated:
+            pattern = pattern[1:]
+        directories_only = pattern.endswith('/')
+        pattern = pattern.rstrip('/')
+        if not pattern:
+            continue
+        anchored = '/' in pattern  # Otherwise it matches at any depth
+        regex = _translate(pattern.lstrip('/'))
+        rules.append((base, re.compile(('^' if anchored else '^(?:.*/)?') + regex + '$'), negated, directories_only))
+    return rules
+
+
+def _is_ignored(path: str, is_dir: bool, rules: List[_Rule]) -> bool:
+    ignored = False
+    for base, regex, negated, directories_only in rules:
+        if directories_only and not is_dir:
+            continue
+        if base:
+            if not path.startswith(base + '/'):
+                continue
+            relative_path = path[len(base) + 1:]
+        else:
+            relative_path = path
+        if regex.match(relative_path):
+            ignored = not negated  # The last matching rule wins
+    return ignored
+
+
+class FileIndex:
+    """Files under a root by name, found by a single walk skipping ignored directories and the ones of .gitignore files"""
+
+    def __init__(self, root: Path, ignores: Iterable[str] = DEFAULT_IGNORES, gitignore: bool = True) -> None:
+        self.root = root
+        self._files: Dict[str, List[str]] = {}
+        self._walk(parse_ignore_patterns(ignores), gitignore)
+
+    def _walk(self, root_rules: List[_Rule], gitignore: bool) -> None:
+        rules_by_dir: Dict[str, List[_Rule]] = {}
+        for directory, dirnames, filenames in os.walk(self.root):
+            relative_dir = Path(directory).relative_to(self.root).as_posix()
+            relative_dir = '' if relative_dir == '.' else relative_dir
+            parent_rules = rules_by_dir.pop(relative_dir, root_rules)
+            rules = parent_rules
+            if gitignore and '.gitignore' in filenames:
+                try:
+                    with open(os.path.join(directory, '.gitignore'), errors='replace') as f:
+                        rules = parent_rules + parse_ignore_patterns(f, relative_dir)
+                except OSError:
+                    pass
+            prefix = f"{relative_dir}/" if relative_dir else ''
+            dirnames[:] = sorted(d for d in dirnames if not _is_ignored(prefix + d, True, rules))
+            for dirname in dirnames:
+                rules_by_dir[prefix + dirname] = rules
+            for filename in filenames:
+                if not _is_ignored(prefix + filename, False, rules):
+                    self._files.setdefault(filename, []).append(prefix + filename)
+
+    def find(self, filename: str, under: Optional[Path] = None) -> Optional[Path]:
+        """The least deep file of this name, relative to `under` (a directory in the index, the root by default)"""
+        prefix = ''
+        if under is not None:
+            prefix = Path(under).relative_to(self.root).as_posix()
+            prefix = '' if prefix == '.' else prefix + '/'
+        candidates = [p for p in self._files.get(filename, []) if p.startswith(prefix)]
+        if not candidates:
+            return None
+        return Path(min(candidates, key=lambda p: (p.count('/'), p))[len(prefix):])
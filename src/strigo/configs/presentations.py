@@ -1,42 +1,84 @@
 # coding: utf8
 from __future__ import annotations
 
+import re
 from dataclasses import dataclass
-from hashlib import md5
+from hashlib import md5, sha256
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
 
 from ..models.presentations import Presentation
+from ..profiling import phase
+from .files import FileIndex
+
+# Metadata written anew by each build of a PDF, even when its content is unchanged
+_VOLATILE_PDF_METADATA = [
+    re.compile(rb'(/(?:CreationDate|ModDate)\s*)(?:\((?:\\.|[^\\)])*\)|<[0-9A-Fa-f\s]*>)'),
+    re.compile(rb'(/ID\s*\[)\s*(?:<[0-9A-Fa-f\s]*>|\((?:\\.|[^\\)])*\))\s*(?:<[0-9A-Fa-f\s]*>|\((?:\\.|[^\\)])*\))\s*(?=\])'),
+    re.compile(rb'(<(xmp:CreateDate|xmp:ModifyDate|xmp:MetadataDate|xmpMM:DocumentID|xmpMM:InstanceID)>)[^<]*(?=</\2>)'),
+    re.compile(rb'(\b(?:xmp:CreateDate|xmp:ModifyDate|xmp:MetadataDate|xmpMM:DocumentID|xmpMM:InstanceID)=)(?:"[^"]*"|\'[^\']*\')'),
+]
+_FINGERPRINT_CHUNK_SIZE = 1024 * 1024
+_MAX_METADATA_SIZE = 64 * 1024  # Matches are searched this far past the end of a chunk, longer metadata values are hashed as is
 
 
 @dataclass
 class PresentationConfig:
     file: str
-    notes_source: str = 'Slides/slides.json'
+    notes_source: Optional[str] = 'Slides/slides.json'  # None for a presentation without notes (e.g. a lab guide)
 
     @staticmethod
     def from_dict(d: Dict[str, Any]) -> PresentationConfig:
         return PresentationConfig(**d)
 
     @staticmethod
-    def from_strigo(presentation: Presentation) -> PresentationConfig:
-        return PresentationConfig(search_file(presentation.filename))
+    def from_strigo(presentation: Presentation, root: Path = Path('.'), index: Optional[FileIndex] = None) -> PresentationConfig:
+        return PresentationConfig(search_file(presentation.filename, root, index))
 
     def file_size(self) -> int:
         return Path(self.file).stat().st_size
 
     def file_md5_sum(self) -> str:
-        hasher = md5()
-        with Path(self.file).open('rb') as f:
-            for chunk in iter(lambda: f.read(65536), b''):
-                hasher.update(chunk)
-        return hasher.hexdigest()
+        with phase('PDF hash'):
+            hasher = md5()
+            with Path(self.file).open('rb') as f:
+                for chunk in iter(lambda: f.read(65536), b''):
+                    hasher.update(chunk)
+            return hasher.hexdigest()
+
+    def file_fingerprint(self) -> str:
+        """Hash of the PDF file ignoring its creation and modification dates and document ids (of uncompressed metadata), unchanged by a new build of the same slides"""
+        with phase('PDF hash'):
+            hasher = sha256()
+            with Path(self.file).open('rb') as f:
+                # The start of `pending` was hashed already, kept for the patterns looking behind
+                pending, start = b'', 0
+                while True:
+                    chunk = f.read(_FINGERPRINT_CHUNK_SIZE)
+                    pending += chunk
+                    end = len(pending) - _MAX_METADATA_SIZE if chunk else len(pending)
+                    if end > start:
+                        matches = sorted((m for pattern in _VOLATILE_PDF_METADATA for m in pattern.finditer(pending, start) if m.start() < end), key=lambda m: m.start())
+                        for match in matches:
+                            if match.start() >= start:  # Not within the match of another pattern
+                                hasher.update(pending[start:match.end(1)])
+                                start = match.end()
+                        hasher.update(pending[start:end])
+                        start = max(start, end)
+                    if not chunk:
+                        return hasher.hexdigest()
+                    if start > 1:
+                        pending, start = pending[start - 1:], 1
+
+
+def duplicate_file_names(files: List[str]) -> List[str]:
+    names = [Path(f).name for f in files]
+    return sorted({n for n in names if names.count(n) > 1})
 
 
-def search_file(filename: str) -> str:
-    paths = list(Path('.').glob(f"**/{filename}"))
-    if len(paths) == 0:
+def search_file(filename: str, root: Path = Path('.'), index: Optional[FileIndex] = None) -> str:
+    """Path of the file relative to `root`, looked up in `index` (of `root` or one of its parents) to avoid walking `root` again"""
+    path = (index or FileIndex(root)).find(filename, root)
+    if path is None:
         path = Path('pdf') / filename
-    else:
-        path = paths[0]
     return path.as_posix()
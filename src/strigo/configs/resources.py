@@ -1,13 +1,14 @@
 # coding: utf8
 from __future__ import annotations
 
-from dataclasses import dataclass, field
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
 from typing import Any, Dict, List, Optional, Union
 
 from ..models.resources import STRIGO_DEFAULT_REGION, Resource, ViewInterface, WebviewLink
-from ..scripts import unique_script
+from ..scripts import decompress_script, is_compressed_script, is_instrumented_script, uninstrument_script, unique_script
 from ..scripts.configs import Script
-from . import get_scripts_folder
+from . import FileChanges, get_scripts_folder
 
 STRIGO_DEFAULT_INSTANCE_TYPES = [
     't3.medium', 't3.large', 't3.xlarge',
@@ -225,7 +226,8 @@ class FullResourceImageConfig(ResourceImageConfig):
     @staticmethod
     def from_dict(d: Dict[str, Any]) -> FullResourceImageConfig:
         d['image_region_mapping'] = d.get('image_region_mapping', {})
-        d['image_region_mapping'][d['ec2_region']] = d['image_id']
+        if d.get('ec2_region'):
+            d['image_region_mapping'][d['ec2_region']] = d['image_id']
         return FullResourceImageConfig(**d)
 
 
@@ -239,9 +241,19 @@ class ResourceConfig:
     post_launch_scripts: List[Script] = field(default_factory=list)
     view_interface: Optional[ViewInterface] = None
     webview_links: List[WebviewLink] = field(default_factory=list)
+    compress_init_scripts: bool = False
+    instrument_init_scripts: bool = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = asdict(self)
+        # Only written when set, so that configs written before these options existed are unchanged
+        for option in ('compress_init_scripts', 'instrument_init_scripts'):
+            if not d[option]:
+                del d[option]
+        return d
 
     def unique_init_script(self):
-        return unique_script(self.init_scripts, self.is_windows)
+        return unique_script(self.init_scripts, self.is_windows, compress=self.compress_init_scripts, instrument=self.instrument_init_scripts)
 
     def unique_post_launch_script(self):
         return unique_script(self.post_launch_scripts, self.is_windows, True)
@@ -252,34 +264,34 @@ class ResourceConfig:
         if 'is_windows' not in d:
             d['is_windows'] = d['image'].is_windows
         init_scripts = []
-        for init_script in d['init_scripts']:
+        for init_script in d.get('init_scripts', []):
             init_scripts.append(Script.new_init_script(init_script, d['is_windows']))
         d['init_scripts'] = init_scripts
         post_launch_scripts = []
-        for post_launch_script in d['post_launch_scripts']:
+        for post_launch_script in d.get('post_launch_scripts', []):
             post_launch_scripts.append(Script.new_post_launch_script(post_launch_script))
         d['post_launch_scripts'] = post_launch_scripts
         d['view_interface'] = ViewInterface(d['view_interface']) if 'view_interface' in d and d['view_interface'] else None
-        d['webview_links'] = [WebviewLink.from_dict(e) for e in d['webview_links']]
+        d['webview_links'] = [WebviewLink.from_dict(e) for e in d.get('webview_links', [])]
         return ResourceConfig(**d)
 
     @staticmethod
-    def from_strigo(resource: Resource) -> ResourceConfig:
+    def from_strigo(resource: Resource, root: Path = Path('.'), changes: Optional[FileChanges] = None) -> ResourceConfig:
         image = ResourceImageConfig.from_strigo(resource.is_custom_image, resource.image_id, resource.image_user, resource.ec2_region, resource.image_region_mapping)
-        scripts_folder = get_scripts_folder()
+        scripts_folder = get_scripts_folder(root)
+        changes = changes or FileChanges()
         normalized_resource_name = resource.name.replace('\\s', '_')
         init_scripts: List[Script] = []
-        if resource.userdata:
+        userdata = decompress_script(resource.userdata)
+        if userdata:
             script_path = scripts_folder / f"init_{normalized_resource_name}.{'ps1' if image.is_windows else 'sh'}"
-            with script_path.open('wt') as f:
-                f.write(resource.userdata.replace('<powershell>', '').replace('</powershell>', '').strip() + '\n')
-            init_scripts.append(Script.new_init_script(script_path.as_posix(), image.is_windows))
+            changes.write(script_path, uninstrument_script(userdata, image.is_windows).replace('<powershell>', '').replace('</powershell>', '').strip() + '\n')
+            init_scripts.append(Script.new_init_script(script_path.relative_to(root).as_posix(), image.is_windows))
         post_launch_scripts: List[Script] = []
         if resource.post_launch_script:
             script_path = scripts_folder / f"post_launch_{normalized_resource_name}.ps1"
-            with script_path.open('wt') as f:
-                f.write(resource.post_launch_script)
-            post_launch_scripts.append(Script.new_post_launch_script(script_path.as_posix()))
+            changes.write(script_path, resource.post_launch_script)
+            post_launch_scripts.append(Script.new_post_launch_script(script_path.relative_to(root).as_posix()))
         return ResourceConfig(
             name=resource.name,
             instance_type=resource.instance_type,
@@ -288,5 +300,7 @@ class ResourceConfig:
             view_interface=resource.view_interface,
             webview_links=resource.webview_links,
             init_scripts=init_scripts,
-            post_launch_scripts=post_launch_scripts
+            post_launch_scripts=post_launch_scripts,
+            compress_init_scripts=is_compressed_script(resource.userdata),
+            instrument_init_scripts=is_instrumented_script(userdata, image.is_windows),
         )
@@ -0,0 +1,154 @@
+# coding: utf8
+from __future__ import annotations
+
+import json
+import re
+from functools import cache
+from importlib import resources
+from typing import Any, Callable, Dict, Iterator, List
+
+# Compiled schema node: yields error messages for an instance at a JSON path
+Validator = Callable[[Any, str], Iterator[str]]
+
+_TYPES = {
+    'object': lambda v: isinstance(v, dict),
+    'array': lambda v: isinstance(v, list),
+    'string': lambda v: isinstance(v, str),
+    'boolean': lambda v: isinstance(v, bool),
+    'integer': lambda v: isinstance(v, int) and not isinstance(v, bool),
+    'number': lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    'null': lambda v: v is None
+}
+
+
+class SchemaCompiler:
+    """Compile a JSON schema (the subset used by `strigo.schema.json`) into nested validation closures"""
+
+    def __init__(self, root: Dict[str, Any]) -> None:
+        self._root = root
+        self._refs: Dict[str, Validator] = {}
+
+    def compile(self) -> Validator:
+        return self._compile(self._root)
+
+    def _ref(self, ref: str) -> Validator:
+        if ref not in self._refs:
+            if not ref.startswith('#/'):
+                raise ValueError(f"Unsupported schema reference: {ref}")
+            target = self._root
+            for part in ref[2:].split('/'):
+                target = target[part]
+            self._refs[ref] = lambda v, p: iter(())  # Placeholder for recursive references
+            compiled = self._compile(target)
+            self._refs[ref] = compiled
+        return lambda v, p: self._refs[ref](v, p)
+
+    def _compile(self, schema: Dict[str, Any]) -> Validator:
+        checks: List[Validator] = []
+
+        if '$ref' in schema:
+            checks.append(self._ref(schema['$ref']))
+        if 'type' in schema:
+            types = schema['type'] if isinstance(schema['type'], list) else [schema['type']]
+            type_checks = [_TYPES[t] for t in types]
+
+            def check_type(v: Any, p: str) -> Iterator[str]:
+                if not any(c(v) for c in type_checks):
+                    yield f"{p}: {json.dumps(v)} is not of type {' or '.join(types)}"
+            checks.append(check_type)
+        if 'enum' in schema:
+            enum = schema['enum']
+
+            def check_enum(v: Any, p: str) -> Iterator[str]:
+                if v not in enum:
+                    yield f"{p}: {json.dumps(v)} is not one of {', '.join(json.dumps(e) for e in enum)}"
+            checks.append(check_enum)
+        if 'pattern' in schema:
+            pattern = re.compile(schema['pattern'])
+
+            def check_pattern(v: Any, p: str) -> Iterator[str]:
+                if isinstance(v, str) and not pattern.search(v):
+                    yield f"{p}: {json.dumps(v)} does not match '{pattern.pattern}'"
+            checks.append(check_pattern)
+        if 'oneOf' in schema or 'anyOf' in schema:
+            exactly_one = 'oneOf' in schema
+            alternatives = [self._compile(s) for s in schema.get('oneOf', schema.get('anyOf'))]
+
+            def check_alternatives(v: Any, p: str) -> Iterator[str]:
+                errors = [list(a(v, p)) for a in alternatives]
+                matches = sum(1 for e in errors if not e)
+                if matches == 0:
+                    # Report the closest alternative, the one failing deepest on ties
+                    yield from min(errors, key=lambda e: (len(e), -max(len(m.split(': ')[0]) for m in e)))
+                elif exactly_one and matches > 1:
+                    yield f"{p}: value matches more than one allowed form"
+            checks.append(check_alternatives)
+        if 'required' in schema:
+            required = schema['required']
+
+            def check_required(v: Any, p: str) -> Iterator[str]:
+                if isinstance(v, dict):
+                    for key in required:
+                        if key not in v:
+                            yield f"{p}: missing required property '{key}'"
+            checks.append(check_required)
+        if any(k in schema for k in ('properties', 'patternProperties', 'additionalProperties', 'propertyNames')):
+            properties = {k: self._compile(s) for k, s in schema.get('properties', {}).items()}
+            pattern_properties = [(re.compile(k), self._compile(s)) for k, s in schema.get('patternProperties', {}).items()]
+            additional = schema.get('additionalProperties', True)
+            additional = additional if isinstance(additional, bool) else self._compile(additional)
+            property_names = self._compile(schema['propertyNames']) if 'propertyNames' in schema else None
+
+            def check_properties(v: Any, p: str) -> Iterator[str]:
+                if not isinstance(v, dict):
+                    return
+                for key, value in v.items():
+                    key_path = f"{p}.{key}"
+                    if property_names:
+                        yield from property_names(key, f"{key_path} (property name)")
+                    matched = False
+                    if key in properties:
+                        matched = True
+                        yield from properties[key](value, key_path)
+                    for pattern, validator in pattern_properties:
+                        if pattern.search(key):
+                            matched = True
+                            yield from validator(value, key_path)
+                    if not matched:
+                        if additional is False:
+                            yield f"{p}: unexpected property '{key}'"
+                        elif additional is not True:
+                            yield from additional(value, key_path)
+            checks.append(check_properties)
+        if 'items' in schema or 'minItems' in schema or 'maxItems' in schema:
+            items = self._compile(schema['items']) if 'items' in schema else None
+            min_items = schema.get('minItems', 0)
+            max_items = schema.get('maxItems', None)
+
+            def check_items(v: Any, p: str) -> Iterator[str]:
+                if not isinstance(v, list):
+                    return
+                if len(v) < min_items:
+                    yield f"{p}: must have at least {min_items} element(s)"
+                if max_items is not None and len(v) > max_items:
+                    yield f"{p}: must have at most {max_items} element(s)"
+                if items:
+                    for index, item in enumerate(v):
+                        yield from items(item, f"{p}[{index}]")
+            checks.append(check_items)
+
+        def validate(v: Any, p: str) -> Iterator[str]:
+            for check in checks:
+                yield from check(v, p)
+        return validate
+
+
+@cache
+def config_validator() -> Validator:
+    """The validator of `strigo.schema.json`, compiled once per process"""
+    with resources.files(__package__).joinpath('strigo.schema.json').open('rb') as f:
+        return SchemaCompiler(json.load(f)).compile()
+
+
+def schema_errors(raw_config: Dict[str, Any]) -> List[str]:
+    return list(config_validator()(raw_config, '$'))
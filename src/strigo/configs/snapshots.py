@@ -0,0 +1,108 @@
+# coding: utf8
+from __future__ import annotations
+
+import copy
+import hashlib
+import os
+import pickle
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from ..cache import cache_dir, write_atomically
+from ..scripts.configs import LocalScript, RemoteScript, Script, flatten_scripts
+from ..scripts.github import is_pinned_version
+
+if TYPE_CHECKING:
+    from .classes import ClassConfig
+
+SNAPSHOT_FORMAT_VERSION = 1
+
+_FileState = Optional[Tuple[int, int]]
+
+
+def file_sha256(path: Path) -> str:
+    with path.open('rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _file_state(path: str) -> _FileState:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _scripts(config: ClassConfig) -> List[Script]:
+    return [s for r in config.resources for s in flatten_scripts(r.init_scripts + r.post_launch_scripts)]
+
+
+class ConfigSnapshots:
+    """Snapshots of loaded configs, with their remote scripts, reused while the config file, its local scripts and the tool version are unchanged.
+
+    Snapshots with remote scripts on a branch rather than a commit or a tag are only reused for `mutable_ttl` seconds.
+    They are stored on disk in `directory`, or in memory without it (for a long-running process).
+    """
+
+    def __init__(self, directory: Optional[Path], tool_version: str, mutable_ttl: float = 0) -> None:
+        self._directory = directory
+        self._tool_version = tool_version
+        self.mutable_ttl = mutable_ttl
+        self._memory: Dict[Path, Dict[str, Any]] = {}
+
+    def _file(self, config_path: Path) -> Path:
+        # Local scripts paths are relative to the working directory
+        key = hashlib.sha256(f"{config_path.resolve()}\n{Path.cwd().resolve()}".encode('utf-8')).hexdigest()
+        return Path(self._directory or '') / f"{key}.pickle"
+
+    def _load(self, config_path: Path) -> Optional[Dict[str, Any]]:
+        if self._directory is None:
+            snapshot = self._memory.get(self._file(config_path))
+            # Loaded configs may be modified by their user
+            return {**snapshot, 'config': copy.deepcopy(snapshot['config'])} if snapshot else None
+        try:
+            with self._file(config_path).open('rb') as f:
+                return pickle.load(f)
+        except Exception:
+            return None
+
+    def get(self, config_path: Path, config_sha256: str) -> Optional[ClassConfig]:
+        snapshot = self._load(config_path)
+        if snapshot is None:
+            return None
+        if (snapshot.get('format') != SNAPSHOT_FORMAT_VERSION or snapshot['tool_version'] != self._tool_version
+                or snapshot['config_sha256'] != config_sha256):
+            return None
+        if snapshot['mutable_refs'] and time.time() - snapshot['created_at'] >= self.mutable_ttl:
+            return None
+        if any(_file_state(path) != state for path, state in snapshot['local_files'].items()):
+            return None
+        return snapshot['config']
+
+    def put(self, config_path: Path, config_sha256: str, config: ClassConfig) -> None:
+        scripts = _scripts(config)
+        mutable_refs = any(isinstance(s, RemoteScript) and not is_pinned_version(s.version) for s in scripts)
+        if mutable_refs and not self.mutable_ttl:
+            return  # Could never be used
+        snapshot = {
+            'format': SNAPSHOT_FORMAT_VERSION,
+            'tool_version': self._tool_version,
+            'config_sha256': config_sha256,
+            'local_files': {s.path: _file_state(s.path) for s in scripts if isinstance(s, LocalScript)},
+            'mutable_refs': mutable_refs,
+            'created_at': time.time(),
+            'config': config,
+        }
+        if self._directory is None:
+            self._memory[self._file(config_path)] = {**snapshot, 'config': copy.deepcopy(config)}
+        else:
+            write_atomically(self._file(config_path), pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL))
+
+    @staticmethod
+    def from_environment(tool_version: str) -> Optional[ConfigSnapshots]:
+        """The snapshots configured by the environment variables `Z2S_CONFIG_CACHE` and `Z2S_CONFIG_CACHE_TTL`"""
+        ttl = float(os.environ.get('Z2S_CONFIG_CACHE_TTL', None) or 0)
+        if not ttl and os.environ.get('Z2S_CONFIG_CACHE', '').lower() not in ('1', 'true'):
+            return None
+        return ConfigSnapshots(cache_dir() / 'configs', tool_version, ttl)
@@ -0,0 +1,84 @@
+# coding: utf8
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+from .classes import load_raw_config
+from .presentations import duplicate_file_names
+from .resources import STRIGO_IMAGES
+from .schema import schema_errors
+
+
+@dataclass
+class ValidationReport:
+    config_path: Path
+    errors: List[str] = field(default_factory=list)
+    warnings: List[str] = field(default_factory=list)
+
+    @property
+    def is_valid(self) -> bool:
+        return not self.errors
+
+
+def _script_paths(scripts: List[Any]) -> Iterator[str]:
+    for script in scripts:
+        if isinstance(script, str):
+            yield script
+        elif isinstance(script, dict) and 'path' in script:
+            yield script['path']
+        elif isinstance(script, dict) and isinstance(script.get('parallel'), list):
+            yield from _script_paths(script['parallel'])
+
+
+def _semantic_errors(raw_config: Dict[str, Any], root: Path, report: ValidationReport) -> None:
+    """Same checks as `ClassConfig.from_dict` and the commands, without fetching remote scripts"""
+    presentations = raw_config.get('presentations', [])
+    duplicates = duplicate_file_names([p['file'] for p in presentations if isinstance(p, dict) and isinstance(p.get('file'), str)])
+    if duplicates:
+        report.errors.append(f"$.presentations: Presentations must have distinct file names, Strigo identifies them by file name: {', '.join(duplicates)}")
+    for index, presentation in enumerate(p for p in presentations if isinstance(p, dict)):
+        if 'file' in presentation and not (root / presentation['file']).exists():
+            report.warnings.append(f"$.presentations[{index}].file: File '{(root / presentation['file']).as_posix()}' does not exists (yet)")
+        if presentation.get('notes_source', '') is None:
+            continue
+        notes_source = root / presentation.get('notes_source', 'Slides/slides.json')
+        if not notes_source.exists():
+            report.errors.append(f"$.presentations[{index}].notes_source: Notes source file '{notes_source.as_posix()}' does not exists")
+            continue
+        try:
+            with notes_source.open() as f:
+                slides_list = json.load(f)
+        except ValueError as e:
+            report.errors.append(f"$.presentations[{index}].notes_source: Invalid notes source file '{notes_source.as_posix()}': {e}")
+            continue
+        if not isinstance(slides_list, list):
+            report.errors.append(f"$.presentations[{index}].notes_source: Notes source file '{notes_source.as_posix()}' must contain a list of slide files")
+            continue
+        for slides_file in slides_list:
+            if not (notes_source.parent / slides_file).exists():
+                report.errors.append(f"$.presentations[{index}].notes_source: Slide file '{(notes_source.parent / slides_file).as_posix()}' does not exists")
+
+    for index, resource in enumerate(r for r in raw_config.get('resources', []) if isinstance(r, dict)):
+        image = resource.get('image')
+        image_name = image if isinstance(image, str) else image.get('image_name') if isinstance(image, dict) else None
+        if image_name is not None and image_name not in STRIGO_IMAGES:
+            report.errors.append(f"$.resources[{index}].image: Unknown image name: {image_name}")
+        for kind in ('init_scripts', 'post_launch_scripts'):
+            for path in _script_paths(resource.get(kind, [])):
+                if not (root / path).exists():
+                    report.errors.append(f"$.resources[{index}].{kind}: File '{(root / path).as_posix()}' does not exists")
+
+
+def validate_config_file(config_path: Path) -> ValidationReport:
+    report = ValidationReport(config_path)
+    try:
+        raw_config = load_raw_config(config_path)
+    except Exception as e:
+        report.errors.append(f"Cannot load config file: {e}")
+        return report
+    report.errors.extend(schema_errors(raw_config))
+    _semantic_errors(raw_config, config_path.parent, report)
+    return report
@@ -0,0 +1,57 @@
+# coding: utf8
+from __future__ import annotations
+
+import http.client
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from . import deadline
+from .cassette import active_cassette
+
+
+@dataclass(frozen=True)
+class Timeouts:
+    connect: Optional[float] = 10.0  # Including the TLS handshake
+    read: Optional[float] = 120.0  # For each socket operation, sending included
+
+
+class _ReadTimeoutMixin:
+    read_timeout: Optional[float] = None
+
+    def connect(self) -> None:
+        super().connect()  # With `timeout`, the connect timeout
+        self.sock.settimeout(self.read_timeout)
+
+
+class _HTTPConnection(_ReadTimeoutMixin, http.client.HTTPConnection):
+    pass
+
+
+class _HTTPSConnection(_ReadTimeoutMixin, http.client.HTTPSConnection):
+    pass
+
+
+def apply_timeouts(connection: http.client.HTTPConnection, timeouts: Timeouts) -> None:
+    """Set the timeouts of the next request on the connection, bounded by the current deadline"""
+    connection.timeout = deadline.timeout(timeouts.connect)
+    connection.read_timeout = deadline.timeout(timeouts.read)
+    if connection.sock is not None and hasattr(connection.sock, 'settimeout'):
+        connection.sock.settimeout(connection.read_timeout)
+
+
+def new_connection(scheme: str, host: str, port: Optional[int] = None, timeouts: Timeouts = Timeouts()) -> http.client.HTTPConnection:
+    """HTTP(S) connection with timeouts, and tracing and cassette record/replay configured from the environment"""
+    def connect() -> http.client.HTTPConnection:
+        if scheme == 'https':
+            connection = _HTTPSConnection(host, port, timeout=timeouts.connect)
+        else:
+            connection = _HTTPConnection(host, port, timeout=timeouts.connect)
+        connection.read_timeout = timeouts.read
+        return connection
+
+    cassette = active_cassette()
+    connection = cassette.connection(host, connect) if cassette else connect()
+    if bool(os.environ.get('Z2S_TRACE_HTTP', False)):
+        connection.set_debuglevel(1)
+    return connection
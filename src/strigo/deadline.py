@@ -0,0 +1,68 @@
+# coding: utf8
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from .models.errors import Error
+
+_deadline: Optional[Deadline] = None
+_local = threading.local()
+
+
+class Deadline:
+    """Time budget of a command, bounding the timeouts of its requests"""
+
+    def __init__(self, seconds: float, parent: Optional[Deadline] = None) -> None:
+        self.seconds = seconds
+        self._expires_at = time.monotonic() + seconds
+        if parent is not None:
+            self._expires_at = min(self._expires_at, parent._expires_at)
+
+    def remaining(self) -> float:
+        return max(0.0, self._expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def share(self, parts: int) -> Deadline:
+        """Deadline for one of `parts` successive pieces of work sharing the remaining time"""
+        return Deadline(self.remaining() / max(1, parts), self)
+
+    def check(self, what: str) -> None:
+        if self.expired:
+            raise Error(type='Timeout', message=f"Deadline of {self.seconds:.1f}s exceeded before {what}")
+
+
+def start(seconds: float) -> Deadline:
+    """Start the deadline of the command"""
+    global _deadline
+    _deadline = Deadline(seconds)
+    return _deadline
+
+
+def current() -> Optional[Deadline]:
+    return getattr(_local, 'deadline', None) or _deadline
+
+
+@contextmanager
+def scope(deadline: Optional[Deadline]) -> Iterator[None]:
+    """Use `deadline` for the work done in this block by the current thread"""
+    previous = getattr(_local, 'deadline', None)
+    _local.deadline = deadline
+    try:
+        yield
+    finally:
+        _local.deadline = previous
+
+
+def timeout(default: Optional[float]) -> Optional[float]:
+    """The timeout `default` bounded by the time left before the current deadline"""
+    deadline = current()
+    if deadline is None:
+        return default
+    remaining = max(0.001, deadline.remaining())  # 0 would make the socket non-blocking
+    return remaining if default is None else min(default, remaining)
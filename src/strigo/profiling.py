@@ -0,0 +1,61 @@
+# coding: utf8
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterator
+
+_enabled = False
+_lock = threading.Lock()
+
+
+@dataclass
+class PhaseStats:
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+
+
+_phases: Dict[str, PhaseStats] = {}
+
+
+def enable() -> None:
+    global _enabled
+    _enabled = True
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Time the enclosed block under `name`, nothing is recorded unless profiling is enabled"""
+    if not _enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        with _lock:
+            stats = _phases.setdefault(name, PhaseStats())
+            stats.count += 1
+            stats.total += duration
+            stats.max = max(stats.max, duration)
+
+
+def phases() -> Dict[str, PhaseStats]:
+    with _lock:
+        return dict(_phases)
+
+
+def report(wall_time: float) -> str:
+    lines = [f"{'Phase':<24} {'Count':>6} {'Total (s)':>10} {'Max (s)':>9} {'% wall':>7}"]
+    for name, stats in sorted(phases().items(), key=lambda e: -e[1].total):
+        lines.append(f"{name:<24} {stats.count:>6} {stats.total:>10.3f} {stats.max:>9.3f} {100 * stats.total / wall_time if wall_time else 0:>6.1f}%")
+    lines.append(f"{'wall time':<24} {'':>6} {wall_time:>10.3f}")
+    return '\n'.join(lines) + '\n'
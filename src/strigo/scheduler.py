@@ -0,0 +1,229 @@
+# coding: utf8
+from __future__ import annotations
+
+import http.client
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+THROTTLING_STATUSES = {http.client.TOO_MANY_REQUESTS, http.client.SERVICE_UNAVAILABLE}
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'PUT', 'DELETE'}
+_PATH_WORDS = {'classes', 'presentations', 'resources', 'notes'}
+
+
+def endpoint_name(method: str, path: str) -> str:
+    """Name of the endpoint of a request, with the ids replaced: 'GET /classes/{id}/resources'"""
+    segments = path.split('?')[0].strip('/').split('/')
+    return f"{method} /" + '/'.join(s if s in _PATH_WORDS else '{id}' for s in segments)
+
+
+def _retry_after(response: http.client.HTTPResponse) -> Optional[float]:
+    value = response.getheader('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+@dataclass
+class EndpointStats:
+    requests: int = 0
+    errors: int = 0  # Failed requests after retries
+    retries: int = 0
+    throttled: int = 0
+    latencies: List[float] = field(default_factory=list)  # Of each attempt, in seconds
+
+    def percentile(self, p: float) -> float:
+        if not self.latencies:
+            return 0.0
+        latencies = sorted(self.latencies)
+        return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))]
+
+
+class AdaptiveLimiter:
+    """Limit of in-flight requests, increased additively on fast successes and halved on throttling or latency spikes (AIMD).
+
+    Requests whose latency does not reflect the load of the server, such as file uploads, are released without latency and only count when throttled.
+    """
+
+    def __init__(self, initial: int = 4, minimum: int = 1, maximum: int = 32, latency_factor: float = 3.0) -> None:
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_factor = latency_factor
+        self._in_flight = 0
+        self._base_latency: Optional[float] = None
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def acquire(self) -> None:
+        with self._condition:
+            while self._in_flight >= int(self.limit):
+                self._condition.wait()
+            self._in_flight += 1
+
+    def release(self, latency: Optional[float], throttled: bool) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            now = time.monotonic()
+            if latency is not None and (self._base_latency is None or latency < self._base_latency):
+                self._base_latency = latency
+            congested = throttled or (latency is not None and latency > self.latency_factor * self._base_latency + 0.05)
+            if congested:
+                # Requests in flight during a congestion event report it too, only decrease once per round-trip
+                if now - self._last_decrease > (latency if latency is not None else self._base_latency or 0.0):
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self._last_decrease = now
+            elif latency is not None:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+
+class RequestScheduler:
+    """Run the requests of a Client within the adaptive limit, honoring Retry-After and retrying idempotent requests with jittered backoff.
+
+    Once throttled, requests are also paced: started at least `interval` seconds apart, the interval doubling on each new throttling and shrinking on successes,
+    so that the requests waiting for the end of a pause are not all sent at once.
+    """
+
+    def __init__(self, limiter: AdaptiveLimiter = None, max_retries: int = 5, backoff_base: float = 0.5, backoff_cap: float = 30.0, min_interval: float = 0.01) -> None:
+        self.limiter = limiter or AdaptiveLimiter()
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.min_interval = min_interval
+        self.interval = 0.0
+        self._paused_until = 0.0
+        self._paused_by: Optional[object] = None
+        self._next_start = 0.0
+        self._lock = threading.Lock()
+        self._stats: Dict[str, EndpointStats] = {}
+
+    def _endpoint_stats(self, endpoint: str) -> EndpointStats:
+        with self._lock:
+            return self._stats.setdefault(endpoint, EndpointStats())
+
+    def stats(self) -> Dict[str, EndpointStats]:
+        with self._lock:
+            return dict(self._stats)
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))  # Full jitter
+
+    def _wait_turn(self, request: object) -> bool:
+        """Wait for the end of the pause and for the turn of the request when paced, return whether it waited for a pause of another request"""
+        waited_other = False
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                paused = self._paused_until > now
+                if paused:
+                    waited_other = waited_other or self._paused_by is not request
+                    delay = self._paused_until - now
+                else:
+                    start = max(now, self._next_start)
+                    if self.interval:
+                        self._next_start = start + self.interval
+                    delay = start - now
+                    if delay <= 0:
+                        return waited_other
+            time.sleep(delay)
+            if not paused:
+                with self._lock:
+                    if self._paused_until <= time.monotonic():
+                        return waited_other  # Turn taken, unless paused meanwhile
+
+    def _pause(self, request: object, delay: float) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if now + delay > self._paused_until:
+                if now >= self._paused_until:
+                    # A new throttling, not one of the requests sent along with the one which started the pause
+                    self.interval = min(self.backoff_cap, max(self.min_interval, self.interval * 2))
+                self._paused_until = now + delay
+                self._paused_by = request
+
+    def _succeeded(self) -> None:
+        with self._lock:
+            if self.interval:
+                self.interval = self.interval * 0.99 if self.interval * 0.99 >= self.min_interval / 10 else 0.0
+
+    def run(self, method: str, path: str, send: Callable[[], Tuple[http.client.HTTPResponse, bytes]], latency_signal: bool = True) -> Tuple[http.client.HTTPResponse, bytes]:
+        """Send the request, `latency_signal` False when its latency depends on its size rather than on the load of the server"""
+        stats = self._endpoint_stats(endpoint_name(method, path))
+        retryable = method in IDEMPOTENT_METHODS
+        request = object()
+        attempt = 0
+        free_retries = 0  # Of requests throttled by the pause of another one
+        while True:
+            waited_other = self._wait_turn(request)
+            self.limiter.acquire()
+            start = time.perf_counter()
+            throttled = False
+            try:
+                response, raw_data = send()
+                throttled = response.status in THROTTLING_STATUSES
+            except (OSError, http.client.HTTPException):
+                if not retryable or attempt >= self.max_retries:
+                    with self._lock:
+                        stats.requests += 1
+                        stats.errors += 1
+                    raise
+                response = None
+            finally:
+                latency = time.perf_counter() - start
+                self.limiter.release(latency if latency_signal else None, throttled)
+                with self._lock:
+                    stats.latencies.append(latency)
+
+            if response is not None and not throttled:
+                self._succeeded()
+                with self._lock:
+                    stats.requests += 1
+                    if response.status >= 400:
+                        stats.errors += 1
+                return response, raw_data
+
+            delay = self._backoff(attempt)
+            if throttled:
+                with self._lock:
+                    stats.throttled += 1
+                retry_after = _retry_after(response)
+                if retry_after is not None:
+                    delay = retry_after + random.uniform(0, self.backoff_base)
+                    self._pause(request, retry_after)  # Other requests would be throttled too
+                if retryable and waited_other and free_retries < self.max_retries:
+                    # Only sent when the pause of another request ended, along with the other waiting ones
+                    free_retries += 1
+                    with self._lock:
+                        stats.retries += 1
+                    time.sleep(delay if retry_after is None else 0)
+                    continue
+                if not retryable or attempt >= self.max_retries:
+                    with self._lock:
+                        stats.requests += 1
+                        stats.errors += 1
+                    return response, raw_data
+            with self._lock:
+                stats.retries += 1
+            attempt += 1
+            time.sleep(delay)
+
+
+def stats_report(stats: Dict[str, EndpointStats]) -> str:
+    lines = [f"{'Endpoint':<44} {'Count':>6} {'Errors':>6} {'Retries':>7} {'429/503':>7} {'p50 (s)':>8} {'p95 (s)':>8}"]
+    for name, s in sorted(stats.items()):
+        lines.append(f"{name:<44} {s.requests:>6} {s.errors:>6} {s.retries:>7} {s.throttled:>7} {s.percentile(50):>8.3f} {s.percentile(95):>8.3f}")
+    return '\n'.join(lines) + '\n'
@@ -1,22 +1,97 @@
 # coding: utf8
 
+import base64
+import gzip
+import json
 import re
-from typing import Iterator, List
+import textwrap
+from typing import Iterator, List, Optional
 
-from .configs import Script
+from .configs import ParallelScripts, Script
 
 SCRIPT_COMMENT_RE = re.compile(r'^[ \t]?#[^!].*\n', re.MULTILINE)
 MULTIPLE_EMPTY_LINES_RE = re.compile(r'^\n\n+', re.MULTILINE)
+BOOT_TIMINGS_FILE = '/var/log/ztraining2strigo-boot.jsonl'
+WINDOWS_BOOT_TIMINGS_FILE = 'C:\\ProgramData\\ztraining2strigo-boot.jsonl'
+COMPRESSED_HEADER = 'Compressed by ztraining2strigo (gzip+base64)'
+INSTRUMENTED_SCRIPT_RES = {
+    False: re.compile(
+        r'^z2s_start=\$\(date \+%s\.%N\)\necho "--------- Start (?P<name>[^\n]*) at \$z2s_start"\n(?P<script>.*?)\n'
+        r'z2s_status=\$\?\nz2s_end=\$\(date \+%s\.%N\)\necho "--------- End (?P=name) at \$z2s_end \(exit \$z2s_status\)"\nprintf [^\n]*\n'
+        r'(?P<propagate_status>exit "\$z2s_status"\n)?',
+        re.MULTILINE | re.DOTALL),
+    True: re.compile(
+        r'^\$global:LASTEXITCODE = 0\n\$z2sStart = [^\n]*\nWrite-Output "--------- Start (?P<name>[^\n]*) at \$z2sStart"\n(?P<script>.*?)\n'
+        r'\$z2sStatus = [^\n]*\n\$z2sEnd = [^\n]*\nWrite-Output "--------- End (?P=name) at \$z2sEnd \(exit \$z2sStatus\)"\nAdd-Content [^\n]*\n'
+        r'(?P<propagate_status>if \(\$z2sStatus -ne 0\) \{ throw [^\n]*\n)?',
+        re.MULTILINE | re.DOTALL),
+}
+COMPRESSED_PAYLOAD_RE = re.compile(r"^# " + re.escape(COMPRESSED_HEADER) + r"\n.*?(?:<<'Z2S_PAYLOAD'[^\n]*\n(?P<bash>[A-Za-z0-9+/=\n]+?)\nZ2S_PAYLOAD|\$payload = '(?P<powershell>[A-Za-z0-9+/=]+)')", re.MULTILINE | re.DOTALL)
 
 
-def decorate_script(script: str, name: str, is_windows: bool) -> str:
-    print_cmd = 'Write-Output' if is_windows else 'echo'
-    decorated_script = f'{print_cmd} "--------- Start {name}"\n'
-    decorated_script += script
-    decorated_script += f'\n{print_cmd} "--------- End {name}"\n'
+def decorate_script(script: str, name: str, is_windows: bool, instrument: bool = False, propagate_status: bool = False) -> str:
+    """Script with start and end markers, and when `propagate_status`, ending with the exit status of the script instead of the end marker's"""
+    if instrument:
+        decorated_script = _instrument_script(script, name, is_windows)
+    elif propagate_status:
+        print_cmd = 'Write-Output' if is_windows else 'echo'
+        decorated_script = '$global:LASTEXITCODE = 0\n' if is_windows else ''
+        decorated_script += f'{print_cmd} "--------- Start {name}"\n'
+        decorated_script += f'{script}\n'
+        decorated_script += '$z2sStatus = if ($LASTEXITCODE) { $LASTEXITCODE } elseif ($?) { 0 } else { 1 }\n' if is_windows else 'z2s_status=$?\n'
+        decorated_script += f'{print_cmd} "--------- End {name}"\n'
+    else:
+        print_cmd = 'Write-Output' if is_windows else 'echo'
+        decorated_script = f'{print_cmd} "--------- Start {name}"\n'
+        decorated_script += script
+        decorated_script += f'\n{print_cmd} "--------- End {name}"\n'
+        return decorated_script
+    if propagate_status:
+        # Jobs only fail on terminating errors, not on exit codes
+        decorated_script += 'if ($z2sStatus -ne 0) { throw "Exited with code $z2sStatus" }\n' if is_windows else 'exit "$z2s_status"\n'
     return decorated_script
 
 
+def _instrument_script(script: str, name: str, is_windows: bool) -> str:
+    """Markers with timestamps and exit code, also appended as a JSON line to the boot timings file of the machine"""
+    if is_windows:
+        record = f"@{{script={_powershell_string(name)}; start=$z2sStart; end=$z2sEnd; exit_code=$z2sStatus}}"
+        return (
+            f"$global:LASTEXITCODE = 0\n"
+            f"$z2sStart = [DateTimeOffset]::Now.ToUnixTimeMilliseconds() / 1000\n"
+            f'Write-Output "--------- Start {name} at $z2sStart"\n'
+            f"{script}\n"
+            f"$z2sStatus = if ($LASTEXITCODE) {{ $LASTEXITCODE }} elseif ($?) {{ 0 }} else {{ 1 }}\n"
+            f"$z2sEnd = [DateTimeOffset]::Now.ToUnixTimeMilliseconds() / 1000\n"
+            f'Write-Output "--------- End {name} at $z2sEnd (exit $z2sStatus)"\n'
+            f"Add-Content -Path '{WINDOWS_BOOT_TIMINGS_FILE}' -Value (ConvertTo-Json -Compress {record})\n"
+        )
+    printf_name = json.dumps(name).replace('%', '%%').replace("'", "'\\''")
+    record = f'{{"script": {printf_name}, "start": %s, "end": %s, "exit_code": %s}}\\n'
+    return (
+        f"z2s_start=$(date +%s.%N)\n"
+        f'echo "--------- Start {name} at $z2s_start"\n'
+        f"{script}\n"
+        f"z2s_status=$?\n"
+        f"z2s_end=$(date +%s.%N)\n"
+        f'echo "--------- End {name} at $z2s_end (exit $z2s_status)"\n'
+        f"printf '{record}' \"$z2s_start\" \"$z2s_end\" \"$z2s_status\" >> {BOOT_TIMINGS_FILE}\n"
+    )
+
+
+def is_instrumented_script(script: Optional[str], is_windows: bool) -> bool:
+    return bool(INSTRUMENTED_SCRIPT_RES[is_windows].search(script or ''))
+
+
+def uninstrument_script(script: str, is_windows: bool) -> str:
+    """Script with the instrumented scripts it runs decorated as when not instrumented"""
+    return INSTRUMENTED_SCRIPT_RES[is_windows].sub(lambda m: decorate_script(m.group('script'), m.group('name'), is_windows, propagate_status=bool(m.group('propagate_status'))), script)
+
+
+def _powershell_string(s: str) -> str:
+    return "'" + s.replace("'", "''") + "'"
+
+
 def normalize_script(s: str):
     s = (s or '').strip()
     if s:
@@ -24,9 +99,40 @@ def normalize_script(s: str):
     return s
 
 
-def get_scripts_content(scripts: List[Script], is_windows: bool) -> Iterator[str]:
+def parallel_section(sections: List[str], names: List[str], is_windows: bool) -> str:
+    """Run the sections concurrently, then print their outputs in order and report the failed ones, continuing as after a failed script"""
+    if is_windows:
+        lines = ['$z2sJobs = @()']
+        for name, section in zip(names, sections):
+            lines += [f'$z2sJobs += Start-Job -Name {_powershell_string(name)} -ScriptBlock {{', 'Set-Location $using:PWD', section.rstrip('\n'), '}']
+        lines += [
+            'foreach ($z2sJob in $z2sJobs) {',
+            '  Wait-Job $z2sJob | Out-Null',
+            '  Receive-Job $z2sJob',
+            "  if ($z2sJob.State -eq 'Failed') { Write-Output \"--------- Failed $($z2sJob.Name)\" }",
+            '}',
+        ]
+    else:
+        lines = ['z2s_logs=$(mktemp -d)', 'z2s_pids=()']
+        for index, section in enumerate(sections):
+            lines += ['(', section.rstrip('\n'), f') > "$z2s_logs/{index}.log" 2>&1 &', 'z2s_pids+=($!)']
+        for index, name in enumerate(names):
+            lines += [
+                f'z2s_status=0; wait "${{z2s_pids[{index}]}}" || z2s_status=$?',
+                f'cat "$z2s_logs/{index}.log"',
+                f'if [ "$z2s_status" -ne 0 ]; then echo "--------- Failed {name} (exit $z2s_status)"; fi',
+            ]
+        lines += ['rm -rf "$z2s_logs"']
+    return '\n'.join(lines) + '\n'
+
+
+def get_scripts_content(scripts: List[Script], is_windows: bool, instrument: bool = False, in_parallel: bool = False) -> Iterator[str]:
     for script in scripts:
-        yield decorate_script(script.content, script.name, is_windows)
+        if isinstance(script, ParallelScripts):
+            yield parallel_section(['\n'.join(get_scripts_content([s], is_windows, instrument, in_parallel=True)) for s in script.parallel], [s.name for s in script.parallel], is_windows)
+        else:
+            # The status of a parallel job is the one of its last command, make it the one of the script to report its failure
+            yield decorate_script(script.content, script.name, is_windows, instrument, propagate_status=in_parallel)
 
 
 def minify_script(script: str) -> str:
@@ -35,11 +141,62 @@ def minify_script(script: str) -> str:
     return script
 
 
-def unique_script(scripts: List[Script], is_windows: bool, is_post_launch: bool = False):
-    full_script = normalize_script('\n'.join(get_scripts_content(scripts, is_windows)))
+def unique_script(scripts: List[Script], is_windows: bool, is_post_launch: bool = False, compress: bool = False, instrument: bool = False):
+    full_script = normalize_script('\n'.join(get_scripts_content(scripts, is_windows, instrument and not is_post_launch)))
     if is_windows and full_script and not is_post_launch:
         full_script = f"<powershell>\n\n{full_script}\n</powershell>\n"
     elif not is_windows and full_script:
         full_script = f"#!/bin/bash\n\n{full_script}"
     full_script = minify_script(full_script)
+    if compress and not is_post_launch:
+        full_script = compress_script(full_script, is_windows)
     return full_script
+
+
+def _compressed_payload(script: str) -> str:
+    # No timestamp in the gzip header, so that the same script always gives the same userdata
+    return base64.b64encode(gzip.compress(script.encode('utf-8'), compresslevel=9, mtime=0)).decode('ascii')
+
+
+def compress_script(script: str, is_windows: bool) -> str:
+    """Self-extracting bootstrap running the gzip+base64 compressed script"""
+    if not script:
+        return script
+    if is_windows:
+        inner_script = script.replace('<powershell>', '').replace('</powershell>', '').strip() + '\n'
+        return (
+            f"<powershell>\n"
+            f"# {COMPRESSED_HEADER}\n"
+            f"$payload = '{_compressed_payload(inner_script)}'\n"
+            f"$stream = New-Object System.IO.Compression.GZipStream((New-Object System.IO.MemoryStream(,[Convert]::FromBase64String($payload))), [System.IO.Compression.CompressionMode]::Decompress)\n"
+            f"$script = Join-Path $env:TEMP 'ztraining2strigo_init.ps1'\n"
+            f"[System.IO.File]::WriteAllText($script, (New-Object System.IO.StreamReader($stream, [System.Text.Encoding]::UTF8)).ReadToEnd())\n"
+            f"powershell.exe -NoProfile -ExecutionPolicy Bypass -File $script\n"
+            f"exit $LASTEXITCODE\n"
+            f"</powershell>\n"
+        )
+    payload = '\n'.join(textwrap.wrap(_compressed_payload(script), 76))
+    return (
+        f"#!/bin/bash\n"
+        f"# {COMPRESSED_HEADER}\n"
+        f"script=$(mktemp)\n"
+        f"base64 -d <<'Z2S_PAYLOAD' | gunzip > \"$script\"\n"
+        f"{payload}\n"
+        f"Z2S_PAYLOAD\n"
+        f"exec /bin/bash \"$script\"\n"
+    )
+
+
+def decompress_script(script: Optional[str]) -> Optional[str]:
+    """Script carried by a bootstrap of `compress_script`, other scripts are returned unchanged"""
+    match = COMPRESSED_PAYLOAD_RE.search(script or '')
+    if not match:
+        return script
+    if match.group('powershell'):
+        inner_script = gzip.decompress(base64.b64decode(match.group('powershell'))).decode('utf-8')
+        return f"<powershell>\n\n{inner_script}\n</powershell>\n"
+    return gzip.decompress(base64.b64decode(match.group('bash'))).decode('utf-8')
+
+
+def is_compressed_script(script: Optional[str]) -> bool:
+    return bool(COMPRESSED_PAYLOAD_RE.search(script or ''))
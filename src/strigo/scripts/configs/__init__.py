@@ -5,7 +5,7 @@ import json
 from dataclasses import dataclass, field
 from enum import Enum
 from pathlib import Path
-from typing import Any, Dict, Union
+from typing import Any, Dict, Iterator, List, Union
 
 from ..github import retrieve_script
 
@@ -37,6 +37,8 @@ class Script:
     def new_init_script(value: Union[str, Dict[str, Any]], is_windows: bool) -> Script:
         if isinstance(value, str):
             return LocalScript(value)
+        elif isinstance(value, dict) and 'parallel' in value:
+            return ParallelScripts([Script.new_init_script(v, is_windows) for v in value['parallel']])
         elif isinstance(value, dict):
             script_type = ScriptType.WINDOWS_INIT if is_windows else ScriptType.INIT
             return Script._new_script(script_type, value)
@@ -91,3 +93,22 @@ class RemoteScript(Script):
     def from_dict(script_type: ScriptType, d: Dict[str, Any]) -> Script:
         d['env'] = {k: (v if isinstance(v, str) else json.dumps(v, separators=(',', ':'))) for k, v in d.get('env', {}).items()}
         return RemoteScript(script_type=script_type, **d)
+
+
+@dataclass
+class ParallelScripts(Script):
+    """Independent init scripts, run concurrently on the machine"""
+    parallel: List[Script] = field(default_factory=list)
+
+    @property
+    def name(self) -> str:
+        return ', '.join(s.name for s in self.parallel)
+
+
+def flatten_scripts(scripts: List[Script]) -> Iterator[Script]:
+    """The scripts, with the ones of parallel groups in place of the groups"""
+    for script in scripts:
+        if isinstance(script, ParallelScripts):
+            yield from flatten_scripts(script.parallel)
+        else:
+            yield script
@@ -1,21 +1,140 @@
 # coding: utf8
 
 import http.client
+import io
+import os
+import re
+import shutil
+import tarfile
+import tempfile
+import threading
 from functools import lru_cache
+from pathlib import Path, PurePosixPath
+from typing import List, Optional
 
+from .. import deadline
+from ..cache import cache_dir
+from ..connections import Timeouts, apply_timeouts, new_connection
 from ..models.errors import Error
+from ..profiling import phase
 
-_CONNECTION = http.client.HTTPSConnection('raw.githubusercontent.com')
+_HOST = 'raw.githubusercontent.com'
+_ARCHIVES_HOST = 'codeload.github.com'
 _REPOSITORY = 'Zenika/strigo-init-script-libs'
+_LOCAL = threading.local()
+_TIMEOUTS = Timeouts(connect=10.0, read=30.0)
+_BUNDLES_LOCK = threading.Lock()
+
+
+def _connection() -> http.client.HTTPConnection:
+    connection = getattr(_LOCAL, 'connection', None)
+    if connection is None:
+        connection = _LOCAL.connection = new_connection('https', _HOST, timeouts=_TIMEOUTS)
+    return connection
 
 
 @lru_cache(maxsize=None)
 def retrieve_script(script: str, version: str, folder: str) -> str:
-    _CONNECTION.connect()
+    with phase('remote script fetch'):
+        library_dir = _library_dir(version)
+        if library_dir is None:
+            return _retrieve_script(script, version, folder)
+        try:
+            return (library_dir / folder / script).read_text(encoding='utf-8')
+        except FileNotFoundError:
+            raise Error(type='NotFound', message=f"Script '{folder}/{script}' not found in '{library_dir}'") from None
+
+
+def bundles_dir() -> Path:
+    """Directory of the library versions, one subdirectory per version, `Z2S_SCRIPTS_LIB_STORE` or in the cache directory"""
+    return Path(os.environ.get('Z2S_SCRIPTS_LIB_STORE', None) or cache_dir() / 'scripts-libs')
+
+
+def _library_dir(version: str) -> Optional[Path]:
+    """Local directory serving the scripts of the version, None to download them one by one"""
+    if os.environ.get('Z2S_SCRIPTS_LIB_DIR', None):
+        return Path(os.environ['Z2S_SCRIPTS_LIB_DIR'])  # A checkout, whatever the version
+    if os.environ.get('Z2S_SCRIPTS_LIB_BUNDLES', '').lower() not in ('1', 'true'):
+        return None  # Opt-in: a branch named like a tag would be served from a stale archive
+    if not is_pinned_version(version):
+        return None  # Branches move, their scripts are not stored
+    version_dir = bundles_dir() / version
+    if version_dir.is_dir():
+        return version_dir
+    with _BUNDLES_LOCK:  # Downloaded once for all the scripts of the version
+        if not version_dir.is_dir():
+            _download_bundle(version, version_dir)
+    return version_dir
+
+
+def _safe_members(members: List[tarfile.TarInfo]) -> List[tarfile.TarInfo]:
+    """Members of an archive checked to be extracted within the target directory, as by the 'data' filter"""
+    for member in members:
+        path = PurePosixPath(member.name)
+        target = path.parent / member.linkname if member.issym() else PurePosixPath(member.linkname)
+        if path.is_absolute() or '..' in path.parts or not (member.isfile() or member.isdir() or member.issym()) \
+                or (member.issym() and (target.is_absolute() or os.path.normpath(target).startswith('..'))):
+            raise tarfile.TarError(f"Unsafe member in archive: {member.name}")
+        member.mode = (member.mode | 0o600) & (0o755 if member.mode & 0o100 else 0o644)
+        member.uid = member.gid = 0
+        member.uname = member.gname = ''
+    return members
+
+
+def _download_bundle(version: str, version_dir: Path) -> None:
+    url = f"/{_REPOSITORY}/tar.gz/{version}"
+    current_deadline = deadline.current()
+    if current_deadline:
+        current_deadline.check(f"GET {_ARCHIVES_HOST}{url}")
+    connection = new_connection('https', _ARCHIVES_HOST, timeouts=_TIMEOUTS)
+    try:
+        connection.request('GET', url)
+        response = connection.getresponse()
+        raw_data = response.read()
+    except TimeoutError:
+        raise Error(type='Timeout', message=f"GET {_ARCHIVES_HOST}{url}: timed out") from None
+    finally:
+        connection.close()
+    if response.status != http.client.OK:
+        raise Error(type='HTTPError', message=f"{_ARCHIVES_HOST}{url}: {response.status} {response.reason}")
+
+    version_dir.parent.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(dir=version_dir.parent, prefix=f".{version}."))
+    try:
+        with tarfile.open(fileobj=io.BytesIO(raw_data), mode='r:gz') as archive:
+            members = []
+            for member in archive.getmembers():
+                # Without the top directory '<repository>-<version>/'
+                _, _, member.name = member.name.partition('/')
+                if member.name:
+                    members.append(member)
+            if hasattr(tarfile, 'data_filter'):
+                archive.extractall(tmp_dir, members=members, filter='data')
+            else:  # Before Python 3.11.4
+                archive.extractall(tmp_dir, members=_safe_members(members))
+        os.rename(tmp_dir, version_dir)  # Complete versions only, even for concurrent processes
+    except OSError:
+        if not version_dir.is_dir():
+            raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _retrieve_script(script: str, version: str, folder: str) -> str:
     url = f"/{_REPOSITORY}/{version}/{folder}/{script}"
-    _CONNECTION.request('GET', url)
-    response = _CONNECTION.getresponse()
-    raw_data = response.read()
+    current_deadline = deadline.current()
+    if current_deadline:
+        current_deadline.check(f"GET {_HOST}{url}")
+    connection = _connection()
+    apply_timeouts(connection, _TIMEOUTS)
+    try:
+        connection.connect()
+        connection.request('GET', url)
+        response = connection.getresponse()
+        raw_data = response.read()
+    except TimeoutError:
+        connection.close()
+        raise Error(type='Timeout', message=f"GET {_HOST}{url}: timed out") from None
     charset = response.headers.get_content_charset()
     if raw_data and charset:
         data = raw_data.decode(charset)
@@ -25,3 +144,12 @@ def retrieve_script(script: str, version: str, folder: str) -> str:
             message += f" -> {data}"
         raise Error(type='HTTPError', message=message)
     return data
+
+
+_COMMIT_SHA_RE = re.compile(r'^[0-9a-f]{7,40}$')
+_RELEASE_TAG_RE = re.compile(r'^v?\d+(\.\d+)+([-+][0-9A-Za-z.-]+)?$')
+
+
+def is_pinned_version(version: str) -> bool:
+    """Whether the git version looks immutable (a commit SHA or a release tag) rather than a branch"""
+    return bool(_COMMIT_SHA_RE.match(version) or _RELEASE_TAG_RE.match(version))
@@ -0,0 +1,73 @@
+# coding: utf8
+from __future__ import annotations
+
+import json
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+MARKER_RE = re.compile(r'--------- (?P<kind>Start|End) (?P<script>.+?) at (?P<timestamp>\d+(?:[.,]\d+)?)(?: \(exit (?P<exit_code>-?\d+)\))?\s*$')
+
+
+@dataclass
+class ScriptTiming:
+    script: str
+    start: float
+    end: Optional[float] = None  # None when the script did not finish
+    exit_code: Optional[int] = None
+
+    @property
+    def duration(self) -> Optional[float]:
+        return None if self.end is None else self.end - self.start
+
+    @property
+    def failed(self) -> bool:
+        return self.end is None or bool(self.exit_code)
+
+
+def _timestamp(value: str) -> float:
+    return float(value.replace(',', '.'))
+
+
+def parse_boot_log(lines: Iterable[str]) -> List[ScriptTiming]:
+    """Timings of the instrumented init scripts found in boot timings files (JSON lines) or console outputs (timestamped markers)"""
+    timings: List[ScriptTiming] = []
+    running: Dict[str, ScriptTiming] = {}
+    for line in lines:
+        line = line.strip()
+        if line.startswith('{'):
+            try:
+                record = json.loads(line)
+                timings.append(ScriptTiming(record['script'], float(record['start']), float(record['end']), int(record['exit_code'])))
+            except (ValueError, KeyError, TypeError):
+                pass
+            continue
+        match = MARKER_RE.search(line)
+        if not match:
+            continue
+        script = match.group('script')
+        if match.group('kind') == 'Start':
+            timing = running[script] = ScriptTiming(script, _timestamp(match.group('timestamp')))
+            timings.append(timing)
+        elif script in running:
+            timing = running.pop(script)
+            timing.end = _timestamp(match.group('timestamp'))
+            timing.exit_code = int(match.group('exit_code') or 0)
+    return timings
+
+
+def report(timings: List[ScriptTiming]) -> str:
+    per_script: Dict[str, List[ScriptTiming]] = {}
+    for timing in timings:
+        per_script.setdefault(timing.script, []).append(timing)
+
+    def total(script_timings: List[ScriptTiming]) -> float:
+        return sum(t.duration for t in script_timings if t.duration is not None)
+
+    lines = [f"{'Script':<48} {'Runs':>5} {'Failed':>6} {'Mean (s)':>9} {'Max (s)':>9} {'Total (s)':>10}"]
+    for script, script_timings in sorted(per_script.items(), key=lambda e: -total(e[1])):
+        durations = [t.duration for t in script_timings if t.duration is not None]
+        mean = total(script_timings) / len(durations) if durations else 0.0
+        lines.append(f"{script:<48} {len(script_timings):>5} {sum(1 for t in script_timings if t.failed):>6} {mean:>9.1f} {max(durations, default=0.0):>9.1f} {total(script_timings):>10.1f}")
+    lines.append(f"{'all scripts (sum)':<48} {len(timings):>5} {sum(1 for t in timings if t.failed):>6} {'':>9} {'':>9} {total(timings):>10.1f}")
+    return '\n'.join(lines) + '\n'
@@ -1,31 +1,58 @@
 # coding: utf8
 
 import argparse
+import cProfile
+import json
 import os
+import signal
 import sys
-from difflib import unified_diff
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from getpass import getpass
-from itertools import zip_longest
 from pathlib import Path
-from typing import Any, Callable, Dict, List
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
+from strigo import deadline, profiling
 from strigo.api import UNDEFINED
 from strigo.api import classes as classes_api
 from strigo.api import presentations as presentations_api
-from strigo.api import resources as resources_api
-from strigo.client import Client
-from strigo.configs import bootstrap_config_file
+from strigo.cache import ResponseCache
+from strigo.client import STRIGO_ENDPOINT, Client
+from strigo.configs import FileChanges, bootstrap_config_file
 from strigo.configs.classes import ClassConfig
+from strigo.configs.files import DEFAULT_IGNORES, FileIndex
+from strigo.configs.snapshots import ConfigSnapshots, file_sha256
 from strigo.configs.presentations import PresentationConfig
 from strigo.configs.resources import AWS_REGIONS, STRIGO_DEFAULT_INSTANCE_TYPES, STRIGO_IMAGES, FullResourceImageConfig, PredefinedResourceImageConfig, ResourceConfig, ResourceImageConfig
+from strigo.configs.validation import validate_config_file
+from strigo.connections import Timeouts
 from strigo.models.classes import Class
-from strigo.models.resources import Resource, ViewInterface, WebviewLink
+from strigo.models.resources import ViewInterface, WebviewLink
+from strigo.scheduler import AdaptiveLimiter, RequestScheduler, stats_report
 from strigo.scripts.configs import Script
-
-from .notes_parser import parse_notes
+from strigo.scripts.github import retrieve_script
+from strigo.scripts.timings import parse_boot_log
+from strigo.scripts.timings import report as timings_report
+
+from .bench import DEFAULT_MIX, bench_report, bench_summary, find_targets, parse_mix, run_bench
+from .prepare import default_jobs, prepare_local_state
+from .plan import Journal, Plan, SyncState, apply_plan, build_plan
+from .scope import SyncScope
+from .shard import UpdateCosts, config_key, parse_shard, split_shards
+from .serve import JobQueue, JobServer
+from .snapshot import RemoteSnapshot, fetch_snapshot
+from .watch import changes_scope, git_changed_paths, git_ignored_paths, listing_paths, watch_changes, watched_paths
 
 VERSION = '0.1.0'
 
+# Warm state of the worker processes of the serve command
+_config_snapshots: Optional[ConfigSnapshots] = None
+_worker_client: Optional[Client] = None
+_worker_refresh = 0.0
+_worker_refreshed_at = 0.0
+
 
 def _prompt(prompt: str, is_valid: Callable[[str], bool] = lambda a: a, choices: List[str] = None) -> str:
     choices_prompt = ''
@@ -59,144 +86,70 @@ def _confirm(prompt: str) -> bool:
             print('Please answer by y[es] or n[o]', file=sys.stderr)
 
 
-def _show_diff(a: str, b: str, prefix: str = '\t') -> None:
-    diff_lines = unified_diff(
-        [] if not a else a.splitlines(keepends=True),
-        [] if not b else b.splitlines(keepends=True),
-        fromfile='strigo', tofile='local'
-    )
-    sys.stdout.writelines(prefix + line for line in diff_lines)
+def _plan(client: Client, config: ClassConfig, existing_class: Class = None, diff: bool = False, scope: SyncScope = None, jobs: int = None, sync_state: Optional[SyncState] = None) -> Tuple[Plan, RemoteSnapshot]:
+    scope = scope or SyncScope.full()
 
+    # Remote reads and local computations don't depend on each other
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        remote_future = executor.submit(fetch_snapshot, client, existing_class.id if existing_class else config.id, scope, existing_class)
+        local = prepare_local_state(config, scope, jobs, fingerprints=sync_state is not None)
+        remote = remote_future.result()
 
-def _dict_to_display(d: Dict[str, Any]) -> str:
-    return '\n'.join(sorted(f"{k}: {v}" for k, v in d.items())) + '\n'
+    return build_plan(config, remote, local, scope, diff, sync_state), remote
 
 
-def _to_strigo(client: Client, config: ClassConfig, existing_class: Class = None, dry_run: bool = False, diff: bool = False) -> None:
-    messages_prefix = ''
-    if dry_run:
-        messages_prefix = '(dry-run) '
-
-    if not existing_class:
-        existing_class = classes_api.get(client, config.id)
-
-    needs_update = False
-    if config.name != existing_class.name:
-        print(f"Will update class name from {existing_class.name} to {config.name}")
-        needs_update = True
-    if config.strigo_description and config.strigo_description != existing_class.str_description:
-        print("Will update class description")
-        _show_diff(existing_class.str_description + '\n', config.strigo_description + '\n')
-        needs_update = True
-    if config.labels and set(config.labels) != set(existing_class.labels):
-        print("Will update class labels")
-        _show_diff('\n'.join(sorted(existing_class.labels)) + '\n', '\n'.join(sorted(config.labels)) + '\n')
-        needs_update = True
-    if needs_update and not dry_run:
-        print(f"{messages_prefix}Updating class {existing_class.id}")
-        classes_api.update(client, existing_class.id, config.name, config.strigo_description or UNDEFINED, config.labels or UNDEFINED)
-
-    existing_presentations = presentations_api.list(client, existing_class.id)
-    existing_presentations_per_filename = {p.filename: p for p in existing_presentations}
-    presentations_per_filename = {Path(p.file).name: p for p in config.presentations}
-    for presentation in (p for p in existing_presentations if p.filename not in presentations_per_filename):
-        print(f"{messages_prefix}Deleting existing presentation with id {presentation.id} of file {presentation.filename}")
-        if not dry_run:
-            presentations_api.delete(client, existing_class.id, presentation.id)
-    for presentation in (p for f, p in presentations_per_filename.items() if f not in existing_presentations_per_filename):
-        print(f"{messages_prefix}Creating presentation {presentation.file}")
+def _resume(client: Client, journal: Journal, dry_run: bool = False, api_jobs: int = 4, sync_state: Optional[SyncState] = None) -> Optional[Dict[str, Any]]:
+    """Results of the interrupted plan of the journal once resumed, None without one"""
+    interrupted = journal.resume()
+    if interrupted is None:
+        return None
+    plan, results, unfinished = interrupted
+    stale = [o for o in plan.operations if o.id not in results and o.is_stale]
+    if stale:
+        print(f"WARNING: Not resuming interrupted plan from '{journal.path.as_posix()}', files changed since: {', '.join(o.message for o in stale)}", file=sys.stderr)
         if not dry_run:
-            created_presentation = presentations_api.create(client, existing_class.id, Path(presentation.file))
-            presentations_api.create_notes(client, existing_class.id, created_presentation.id, parse_notes(Path(presentation.notes_source)))
-    for presentation, existing_presentation in ((p, existing_presentations_per_filename[f]) for f, p in presentations_per_filename.items() if f in existing_presentations_per_filename):
-        notes = parse_notes(Path(presentation.notes_source))
-        needs_update = presentation.file_size() != existing_presentation.size_bytes
-        if not needs_update:  # Don't verify checksum if update is already needed
-            needs_update = presentation.file_md5_sum() != existing_presentation.md5
-        if needs_update:
-            print(f"{messages_prefix}Updating presentation {presentation.file}")
-            if not dry_run:
-                updated_presentation = presentations_api.update(client, existing_class.id, existing_presentation.id, Path(presentation.file))
-                presentations_api.create_notes(client, existing_class.id, updated_presentation.id, notes)
-        else:
-            existing_notes = presentations_api.get_notes(client, existing_class.id, existing_presentation.id)
-            if notes != existing_notes:
-                print(f"{messages_prefix}Updating presentation notes for {presentation.file}")
-                if not dry_run:
-                    presentations_api.create_notes(client, existing_class.id, existing_presentation.id, notes)
-
-    existing_resources = resources_api.list(client, existing_class.id)
-    for index, (resource, existing_resource) in enumerate(zip_longest(config.resources, existing_resources)):
-        resource: ResourceConfig
-        existing_resource: Resource
-        if resource is None:
-            print(f"{messages_prefix}Deleting machine {index} named {existing_resource.name}")
-            if not dry_run:
-                resources_api.delete(client, existing_class.id, existing_resource.id)
-        else:
-            image = resource.image
-
-            init_script = resource.unique_init_script() or UNDEFINED
-            post_launch_script = resource.unique_post_launch_script() or UNDEFINED
-
-            if existing_resource is None:
-                print(f"{messages_prefix}Creating machine {index} named {resource.name}")
-                if not dry_run:
-                    resources_api.create(
-                        client, existing_class.id, resource.name, image.id, image.user,
-                        resource.view_interface, resource.webview_links,
-                        post_launch_script, init_script,
-                        image.region, resource.instance_type,
-                        image.region_mapping
-                    )
-            else:
-                needs_update = False
-
-                if resource.name != existing_resource.name:
-                    print(f"Will update machine {index} name from {existing_resource.name} to {resource.name}")
-                    needs_update = True
-                if resource.instance_type != existing_resource.instance_type:
-                    print(f"Will update machine {index} type from {existing_resource.instance_type} to {resource.instance_type}")
-                    needs_update = True
-                if image.region_mapping != existing_resource.image_region_mapping:
-                    print(f"Will update machine {index} images")
-                    if diff:
-                        _show_diff(_dict_to_display(existing_resource.image_region_mapping), _dict_to_display(image.region_mapping))
-                    needs_update = True
-                if image.user != existing_resource.image_user:
-                    print(f"Will update machine {index} image user from {existing_resource.image_user} to {image.user}")
-                    needs_update = True
-                if init_script != existing_resource.userdata and (init_script or existing_resource.userdata):
-                    print(f"Will update machine {index} init script")
-                    if diff:
-                        _show_diff(existing_resource.userdata, init_script)
-                    needs_update = True
-                if post_launch_script != existing_resource.post_launch_script and (post_launch_script or existing_resource.post_launch_script):
-                    print(f"Will update machine {index} post launch script")
-                    if diff:
-                        _show_diff(existing_resource.post_launch_script, post_launch_script)
-                    needs_update = True
-                if resource.view_interface is not None and resource.view_interface != existing_resource.view_interface:
-                    print(f"Will update machine {index} view interface from {existing_resource.view_interface.value} to {resource.view_interface.value}")
-                    needs_update = True
-                if resource.webview_links != existing_resource.webview_links:
-                    print(f"Will update machine {index} webview links")
-                    needs_update = True
-                if needs_update:
-                    print(f"{messages_prefix}Updating machine {index} named {resource.name}")
-                    if not dry_run:
-                        resources_api.update(
-                            client, existing_class.id, existing_resource.id,
-                            resource.name, image.id, image.user,
-                            resource.view_interface, resource.webview_links,
-                            post_launch_script, init_script,
-                            image.region, resource.instance_type,
-                            image.region_mapping
-                        )
+            journal.finish()
+        return None
+    print(f"Resuming interrupted plan from '{journal.path.as_posix()}': {len(results)} of {len(plan.operations)} operations already applied")
+    for operation in unfinished:
+        print(f"WARNING: Applying again interrupted or failed operation: {operation.message}", file=sys.stderr)
+    if dry_run:
+        for operation in (o for o in plan.operations if o.id not in results):
+            print(f"(dry-run) {operation.message}")
+        return results
+    results = apply_plan(client, plan, api_jobs, journal=journal, results=results)
+    if sync_state:
+        sync_state.record_uploads(plan, results)
+        sync_state.save()
+    return results
+
+
+def _to_strigo(client: Client, config: ClassConfig, existing_class: Class = None, dry_run: bool = False, diff: bool = False, scope: SyncScope = None, jobs: int = None, api_jobs: int = 4, journal: Optional[Journal] = None, sync_state: Optional[SyncState] = None) -> Class:
+    if journal and journal.path.exists():
+        results = _resume(client, journal, dry_run, api_jobs, sync_state)
+        if results is not None and dry_run:
+            return results.get('class') or existing_class
+        # The interrupted plan may have been computed from older files, or not be resumed: compare everything with the class as it is now
+        existing_class = None
+        scope = None
+
+    plan, remote = _plan(client, config, existing_class, diff, scope, jobs, sync_state)
+    if dry_run:
+        for operation in plan.operations:
+            print(f"(dry-run) {operation.message}")
+        return remote.cls
+
+    if journal and plan.operations:
+        journal.start(plan)
+    results = apply_plan(client, plan, api_jobs, journal=journal)
+    if sync_state:
+        sync_state.record_uploads(plan, results)
+        sync_state.save()
+    return results.get('class', remote.cls)
 
 
 def create(client: Client, args: argparse.Namespace) -> None:
-    config_file = bootstrap_config_file(args.config)
+    config_file = bootstrap_config_file(args.config, check_not_exists=False)
 
     name = _prompt('Please enter Strigo class name')
 
@@ -291,22 +244,72 @@ def create(client: Client, args: argparse.Namespace) -> None:
     strigo_config.write(config_file)
     print(f"Config stored in '{config_file.absolute()}'")
 
-    _to_strigo(client, strigo_config, existing_class=cls)
+    _to_strigo(client, strigo_config, existing_class=cls, jobs=args.local_jobs)
     print("Done!")
 
 
+def _print_changes(changes: FileChanges, prefix: str = '') -> None:
+    for path in changes.created:
+        print(f"{prefix}created {path.as_posix()}")
+    for path in changes.updated:
+        print(f"{prefix}updated {path.as_posix()}")
+
+
+def _retrieve_class(client: Client, cls: Class, root: Path, config_name: str, index: FileIndex) -> Tuple[Path, FileChanges]:
+    config_file = bootstrap_config_file(root / config_name, check_not_exists=False)
+    presentations = presentations_api.list(client, cls.id)
+    changes = FileChanges()
+    strigo_config = ClassConfig.from_strigo(cls, presentations, root, index, changes)
+    strigo_config.write(config_file, changes)
+    return config_file, changes
+
+
+def _retrieve_all(client: Client, args: argparse.Namespace) -> None:
+    classes = classes_api.list(client)
+    if args.label:
+        classes = [c for c in classes if args.label in c.labels]
+    print(f"Retrieving {len(classes)} classes into '{args.output_dir.absolute()}'")
+    index = FileIndex(args.output_dir, DEFAULT_IGNORES + tuple(args.ignore))  # Presentation files of all the classes
+
+    failures = 0
+    all_changes = FileChanges()
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        futures = {executor.submit(_retrieve_class, client, cls, args.output_dir / cls.id, args.config.name, index): cls for cls in classes}
+        for future in as_completed(futures):
+            cls = futures[future]
+            try:
+                config_file, changes = future.result()
+            except Exception as e:
+                failures += 1
+                print(f"ERROR: Failed to retrieve class {cls.id} ({cls.name}): {e}", file=sys.stderr)
+            else:
+                print(f"Config of class {cls.id} ({cls.name}) stored in '{config_file.as_posix()}' ({changes.summary()})")
+                _print_changes(changes, '  ')
+                all_changes.extend(changes)
+    print(f"Files: {all_changes.summary()}")
+    if failures:
+        raise Exception(f"Failed to retrieve {failures} of {len(classes)} classes")
+
+
 def retrieve(client: Client, args: argparse.Namespace) -> None:
-    config_file = bootstrap_config_file(args.config)
+    if args.all or args.label:
+        return _retrieve_all(client, args)
+    if not args.class_id:
+        print("ERROR: CLASS_ID is required unless --all or --label is used.", file=sys.stderr)
+        exit(1)
+
+    config_file = bootstrap_config_file(args.config, check_not_exists=False)
     cls = classes_api.get(client, args.class_id)
     presentations = presentations_api.list(client, cls.id)
-    strigo_config = ClassConfig.from_strigo(cls, presentations)
-    strigo_config.write(config_file)
+    changes = FileChanges()
+    strigo_config = ClassConfig.from_strigo(cls, presentations, index=FileIndex(Path('.'), DEFAULT_IGNORES + tuple(args.ignore)), changes=changes)
+    strigo_config.write(config_file, changes)
 
-    print(f"Config from Strigo stored in '{config_file.absolute()}'")
+    print(f"Config from Strigo stored in '{config_file.absolute()}' ({changes.summary()})")
+    _print_changes(changes, '  ')
 
 
-def update(client: Client, args: argparse.Namespace) -> None:
-    config_path: Path = args.config
+def _existing_config_path(config_path: Path) -> Path:
     if not config_path.exists():
         toml_config_path = config_path.with_suffix('.toml')
         if config_path.as_posix() == 'strigo.json' and toml_config_path.exists():
@@ -314,42 +317,363 @@ def update(client: Client, args: argparse.Namespace) -> None:
         else:
             print(f"ERROR: Config file {config_path} does not exists.", file=sys.stderr)
             exit(1)
+    return config_path
+
+
+def _load_config(config_path: Path) -> ClassConfig:
+    return ClassConfig.load(config_path, _config_snapshots or ConfigSnapshots.from_environment(VERSION))
+
+
+def _update(client: Client, config_path: Path, args: argparse.Namespace) -> None:
+    strigo_config = _load_config(config_path)
+    journal = Journal.next_to(config_path, file_sha256(config_path))
+    if args.no_resume:
+        journal.finish()
+    sync_state = SyncState.next_to(config_path) if args.pdf_fingerprint else None
+    scope = None
+    if args.since:
+        changed_paths = git_changed_paths(args.since)
+        # Ignored presentation files are compared anyway, they are usually built from the slides and not committed
+        changed_paths |= git_ignored_paths(Path(p.file) for p in strigo_config.presentations)
+        scope = changes_scope(watched_paths(config_path, strigo_config), changed_paths)
+        if scope.is_empty and not journal.path.exists():
+            print(f"No changes since {args.since}")
+            return
+    if args.plan_out:
+        plan, _ = _plan(client, strigo_config, diff=args.diff, scope=scope, jobs=args.local_jobs, sync_state=sync_state)
+        if sync_state:
+            sync_state.save()
+        plan.write(args.plan_out)
+        print(f"Plan of {len(plan.operations)} operations stored in '{args.plan_out.absolute()}'")
+        return
+    _to_strigo(client, strigo_config, dry_run=args.dry_run, diff=args.diff, scope=scope, jobs=args.local_jobs, api_jobs=args.jobs, journal=journal, sync_state=sync_state)
+
+
+@contextmanager
+def _working_directory(directory: Path) -> Iterator[None]:
+    previous = Path.cwd()
+    os.chdir(directory)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
 
-    strigo_config = ClassConfig.load(config_path)
-    _to_strigo(client, strigo_config, dry_run=args.dry_run, diff=args.diff)
 
+def update(client: Client, args: argparse.Namespace) -> None:
+    if not args.configs and not args.shard and not args.store_costs:
+        return _update(client, _existing_config_path(args.config), args)
 
-def main() -> None:
+    if args.store_costs and not args.costs:
+        print("ERROR: --store-costs requires --costs.", file=sys.stderr)
+        exit(1)
+    config_paths: List[Path] = args.configs or [_existing_config_path(args.config)]
+    costs = UpdateCosts(args.costs) if args.costs else None
+    if args.shard:
+        index, count = args.shard
+        # Without a costs file shared by the nodes, only the same costs for all give the same split on all of them
+        config_costs = {config_key(p): costs.cost(p) if costs else 1.0 for p in config_paths}
+        shard = split_shards(config_costs, count)[index - 1]
+        print(f"Shard {index}/{count}: {len(shard)} of {len(config_paths)} configs, estimated cost {sum(config_costs[k] for k in shard):.1f}s of {sum(config_costs.values()):.1f}s")
+        config_paths = [p for p in config_paths if config_key(p) in shard]
+    if args.plan_out and len(config_paths) > 1:
+        print("ERROR: --plan-out can only be used with one config.", file=sys.stderr)
+        exit(1)
+
+    failures = []
+    for config_path in config_paths:
+        print(f"Updating {config_path.as_posix()}")
+        start = time.perf_counter()
+        try:
+            # Paths of each config are relative to its directory
+            with _working_directory(config_path.parent):
+                _update(client, _existing_config_path(Path(config_path.name)), args)
+        except (Exception, SystemExit) as e:  # Commands exit on missing or invalid configs
+            failures.append(config_path)
+            print(f"ERROR: Failed to update {config_path.as_posix()}{f': {e}' if isinstance(e, Exception) else ''}", file=sys.stderr)
+        else:
+            if costs:
+                costs.record(config_path, time.perf_counter() - start)
+    if costs and args.store_costs:
+        costs.save()
+    if failures:
+        raise Exception(f"Failed to update {len(failures)} of {len(config_paths)} configs: {', '.join(p.as_posix() for p in failures)}")
+
+
+def apply(client: Client, args: argparse.Namespace) -> None:
+    plan = Plan.load(args.plan)
+    if not plan.operations:
+        print("Nothing to apply")
+        return
+    journal = Journal.next_to(args.plan, file_sha256(args.plan))
+    if _resume(client, journal, api_jobs=args.jobs) is None:
+        journal.start(plan)
+        apply_plan(client, plan, args.jobs, journal=journal)
+
+
+def watch(client: Client, args: argparse.Namespace) -> None:
+    config_path = _existing_config_path(args.config)
+
+    strigo_config = _load_config(config_path)
+    existing_class = _to_strigo(client, strigo_config, dry_run=args.dry_run, diff=args.diff, jobs=args.local_jobs)
+    paths = watched_paths(config_path, strigo_config)
+    print(f"Watching {len(paths)} files for changes (Ctrl-C to stop)...")
+
+    try:
+        for changed_paths in watch_changes(lambda: paths.keys(), debounce=args.debounce):
+            print(f"Changes detected in {', '.join(sorted(p.as_posix() for p in changed_paths))}")
+            try:
+                scope = SyncScope.empty()
+                for changed_path in changed_paths:
+                    # Paths no longer watched (e.g. since the config changed) are synchronized fully
+                    scope = scope.merge(paths.get(changed_path, SyncScope.full()))
+                if changed_paths & listing_paths(config_path, strigo_config):
+                    if config_path in changed_paths:
+                        strigo_config = _load_config(config_path)
+                        if existing_class.id != strigo_config.id:
+                            existing_class = None
+                    paths = watched_paths(config_path, strigo_config)  # e.g. chapters added to the slides
+                existing_class = _to_strigo(client, strigo_config, existing_class=existing_class, dry_run=args.dry_run, diff=args.diff, scope=scope, jobs=args.local_jobs)
+            except Exception:
+                import traceback
+                traceback.print_exc(limit=None if os.environ.get('DEBUG', False) else 0)
+                continue
+            print("Synchronized, watching for changes...")
+    except KeyboardInterrupt:
+        pass
+
+
+def validate(client: None, args: argparse.Namespace) -> None:
+    config_paths: List[Path] = args.configs or [_existing_config_path(args.config)]
+
+    invalid = 0
+    for config_path in config_paths:
+        report = validate_config_file(config_path)
+        for warning in report.warnings:
+            print(f"WARNING: {config_path.as_posix()}: {warning}", file=sys.stderr)
+        for error in report.errors:
+            print(f"ERROR: {config_path.as_posix()}: {error}", file=sys.stderr)
+        if report.is_valid:
+            print(f"{config_path.as_posix()}: OK")
+        else:
+            invalid += 1
+    if invalid:
+        print(f"{invalid} of {len(config_paths)} config files are invalid", file=sys.stderr)
+        exit(1)
+
+
+def boot_report(client: None, args: argparse.Namespace) -> None:
+    timings = []
+    for log in args.logs or ['-']:
+        if log == '-':
+            timings.extend(parse_boot_log(sys.stdin))
+        else:
+            with Path(log).open(errors='replace') as f:
+                timings.extend(parse_boot_log(f))
+    if not timings:
+        print('No init script timings found, are the machine init scripts instrumented?', file=sys.stderr)
+        exit(1)
+    print(timings_report(timings), end='')
+
+
+def _init_serve_worker(args: argparse.Namespace, organization_id: str, api_key: str) -> None:
+    global _config_snapshots, _worker_client, _worker_refresh
+    _config_snapshots = ConfigSnapshots.from_environment(VERSION) or ConfigSnapshots(None, VERSION, args.refresh)
+    _worker_client = _new_client(args, organization_id, api_key, ResponseCache.from_environment(f"{_strigo_endpoint()}\n{organization_id}") or ResponseCache(None, organization_id))
+    _worker_refresh = args.refresh
+
+
+def _run_serve_job(arguments: List[str]) -> None:
+    global _worker_refreshed_at
+    if time.monotonic() - _worker_refreshed_at >= _worker_refresh:
+        retrieve_script.cache_clear()  # Scripts of git branches may have changed
+        _worker_refreshed_at = time.monotonic()
+    args = _parser().parse_args(arguments)
+    args.func(_worker_client, args)
+
+
+def serve(client: None, args: argparse.Namespace) -> None:
+    queue = JobQueue(args.jobs, _run_serve_job, _init_serve_worker, (args, *_credentials()))
+    if args.socket:
+        from .serve import UnixJobServer
+        server = UnixJobServer(queue, args.socket)
+    else:
+        server = JobServer(queue, ('127.0.0.1', args.port))
+    print(f"Serving jobs on {server.endpoint} with {args.jobs} workers (Ctrl-C to stop)...")
+    signal.signal(signal.SIGTERM, signal.default_int_handler)  # Stop the worker processes too
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        queue.shutdown()
+
+
+def _bench_mix(mix: str) -> Dict[str, int]:
+    try:
+        return parse_mix(mix)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def bench(client: None, args: argparse.Namespace) -> None:
+    organization_id, api_key = _credentials()
+    timeouts = Timeouts(args.connect_timeout, args.read_timeout)
+    targets = find_targets(Client(organization_id, api_key, _strigo_endpoint(), timeouts=timeouts), args.class_ids, bool(args.mix.get('notes')))
+    # Not cached, and at the requested concurrency rather than an adaptive one
+    scheduler = RequestScheduler(AdaptiveLimiter(args.workers, args.workers, args.workers))
+    bench_client = Client(organization_id, api_key, _strigo_endpoint(), scheduler=scheduler, timeouts=timeouts)
+    requests = args.requests or (None if args.duration else 200)
+    print(f"Benchmarking {_strigo_endpoint()} on {len(targets)} classes with {args.workers} workers...", file=sys.stderr)
+    wall_time = run_bench(bench_client, targets, args.mix, args.workers, requests, args.duration, args.seed)
+    summary = bench_summary(bench_client.stats(), wall_time)
+    if args.json:
+        print(json.dumps({'endpoint': _strigo_endpoint(), 'workers': args.workers, 'mix': args.mix, 'time': time.time(), **summary}))
+    else:
+        print(bench_report(summary), end='')
+
+
+def _run_profiled(client: Optional[Client], args: argparse.Namespace) -> None:
+    profiling.enable()
+    profiler = cProfile.Profile() if args.profile_out else None
+    if args.profile_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        if profiler:
+            profiler.runcall(args.func, client, args)
+        else:
+            args.func(client, args)
+    finally:
+        wall_time = time.perf_counter() - start
+        print('\nTiming per phase (concurrent phases overlap):', file=sys.stderr)
+        print(profiling.report(wall_time), file=sys.stderr, end='')
+        if client and client.stats():
+            print('\nStrigo requests per endpoint:', file=sys.stderr)
+            print(stats_report(client.stats()), file=sys.stderr, end='')
+        if args.profile_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"Peak traced memory: {peak / 1024 / 1024:.1f} MiB", file=sys.stderr)
+        if profiler:
+            profiler.dump_stats(args.profile_out)
+            print(f"Profile of main thread stored in '{args.profile_out.absolute()}' (pstats format)", file=sys.stderr)
+
+
+def _credentials() -> Tuple[str, str]:
+    strigo_org_id = os.environ.get('STRIGO_ORG_ID', None)
+    strigo_api_key = os.environ.get('STRIGO_API_KEY', None)
+    if strigo_org_id is None or strigo_api_key is None:
+        print("Environnement variables 'STRIGO_ORG_ID' or 'STRIGO_API_KEY' for Strigo authentication are not set")
+        if strigo_org_id is None:
+            strigo_org_id = input('Please enter Strigo Organization ID: ')
+        if strigo_api_key is None:
+            strigo_api_key = getpass('Please enter Strigo API key: ')
+    return strigo_org_id, strigo_api_key
+
+
+def _strigo_endpoint() -> str:
+    return os.environ.get('STRIGO_ENDPOINT', None) or STRIGO_ENDPOINT
+
+
+def _new_client(args: argparse.Namespace, organization_id: str, api_key: str, response_cache: Optional[ResponseCache] = None) -> Client:
+    # Responses depend on the endpoint and the organization
+    response_cache = response_cache or ResponseCache.from_environment(f"{_strigo_endpoint()}\n{organization_id}")
+    return Client(organization_id, api_key, _strigo_endpoint(), response_cache=response_cache, timeouts=Timeouts(args.connect_timeout, args.read_timeout))
+
+
+def _parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser('ztraining2strigo')
     parser.add_argument('--config', default='strigo.json', type=Path)
+    parser.add_argument('--profile', action='store_true', help='Display the time spent per phase at the end of the command')
+    parser.add_argument('--profile-out', type=Path, help='Store cProfile statistics of the command in this file (implies --profile)')
+    parser.add_argument('--profile-memory', action='store_true', help='Display the peak memory allocated during the command, slows it down (implies --profile)')
+    parser.add_argument('--local-jobs', default=default_jobs(), type=int, help='Number of workers for local hashing, notes parsing and scripts assembly (default: number of CPUs)')
+    parser.add_argument('--connect-timeout', default=10.0, type=float, help='Seconds to connect to Strigo before failing a request (default: %(default)s)')
+    parser.add_argument('--read-timeout', default=120.0, type=float, help='Seconds to wait for each response data from Strigo before failing a request (default: %(default)s)')
+    parser.add_argument('--deadline', type=float, help='Seconds allowed for the whole command, shared by the remaining Strigo operations, none are started once exceeded')
     subparsers = parser.add_subparsers(required=True, help='sub-command help', metavar='COMMAND')
 
     parser_create = subparsers.add_parser('create', help='Create config for new Strigo class. The class parameters are asked interactively.')
     parser_create.set_defaults(func=create)
 
     parser_retrieve = subparsers.add_parser('retrieve', help='Retrieve config from existing Strigo class')
-    parser_retrieve.add_argument('class_id', metavar='CLASS_ID', type=str, help='Existing Strigo class ID')
+    parser_retrieve.add_argument('class_id', metavar='CLASS_ID', type=str, nargs='?', help='Existing Strigo class ID')
+    parser_retrieve.add_argument('--all', action='store_true', help='Retrieve all classes of the organization, each one in its own directory')
+    parser_retrieve.add_argument('--label', help='Retrieve all classes with this label, each one in its own directory')
+    parser_retrieve.add_argument('--output-dir', default=Path('.'), type=Path, help='Directory where to create the classes directories when retrieving multiple classes (default: current directory)')
+    parser_retrieve.add_argument('--jobs', '-j', default=8, type=int, help='Number of classes retrieved concurrently (default: %(default)s)')
+    parser_retrieve.add_argument('--ignore', action='append', default=[], metavar='PATTERN', help=f"Ignore files and directories matching this .gitignore pattern when searching presentation files, in addition to .gitignore files and {', '.join(DEFAULT_IGNORES)} (can be repeated)")
     parser_retrieve.set_defaults(func=retrieve)
 
     parser_update = subparsers.add_parser('update', help='Update Strigo class from config')
+    parser_update.add_argument('configs', metavar='CONFIG', type=Path, nargs='*', help='Config files to update one after the other, each from its directory (default: --config)')
     parser_update.add_argument('--dry-run', '-n', action='store_true', help='Do not perform update')
     parser_update.add_argument('--diff', '-d', action='store_true', help='Display diff of changes to apply in machines scripts')
+    parser_update.add_argument('--plan-out', type=Path, help='Only compute the operations to apply and store them in this file for the apply command')
+    parser_update.add_argument('--jobs', '-j', default=4, type=int, help='Number of Strigo operations applied concurrently (default: %(default)s)')
+    parser_update.add_argument('--since', metavar='REF', help='Only synchronize what depends on the files changed since this git reference (e.g. HEAD~1)')
+    parser_update.add_argument('--no-resume', action='store_true', help='Plan again instead of resuming the operations of an interrupted update')
+    parser_update.add_argument('--pdf-fingerprint', action='store_true', help='Do not upload again presentations whose PDF files only changed in their metadata (dates and ids), using the fingerprints of the uploads recorded next to the config')
+    parser_update.add_argument('--shard', metavar='INDEX/COUNT', type=parse_shard, help='Only update the configs of this shard (from 1 to COUNT) of a split balanced by the cost of their updates, e.g. for CI nodes')
+    parser_update.add_argument('--costs', type=Path, help='File of the durations of the previous updates, used to balance shards, shared by all the nodes (by default, all configs have the same cost)')
+    parser_update.add_argument('--store-costs', action='store_true', help='Record the durations of the updates in the --costs file')
     parser_update.set_defaults(func=update)
 
-    args = parser.parse_args()
+    parser_apply = subparsers.add_parser('apply', help='Apply a plan computed by update --plan-out')
+    parser_apply.add_argument('plan', metavar='PLAN', type=Path, help='Plan file')
+    parser_apply.add_argument('--jobs', '-j', default=4, type=int, help='Number of Strigo operations applied concurrently (default: %(default)s)')
+    parser_apply.set_defaults(func=apply)
+
+    parser_watch = subparsers.add_parser('watch', help='Watch config, slides, scripts and presentation files and update Strigo class on changes')
+    parser_watch.add_argument('--dry-run', '-n', action='store_true', help='Do not perform update')
+    parser_watch.add_argument('--diff', '-d', action='store_true', help='Display diff of changes to apply in machines scripts')
+    parser_watch.add_argument('--debounce', default=1.0, type=float, help='Seconds without changes before synchronizing (default: %(default)s)')
+    parser_watch.set_defaults(func=watch)
+
+    parser_validate = subparsers.add_parser('validate', help='Validate configs against the schema and local files, without accessing Strigo')
+    parser_validate.add_argument('configs', metavar='CONFIG', type=Path, nargs='*', help='Config files to validate (default: --config)')
+    parser_validate.set_defaults(func=validate, needs_client=False)
+
+    parser_boot_report = subparsers.add_parser('boot-report', help='Report the time spent in each init script from the boot logs of instrumented machines')
+    parser_boot_report.add_argument('logs', metavar='LOG', nargs='*', help="Boot timings files or console outputs of machines ('-' or none for standard input)")
+    parser_boot_report.set_defaults(func=boot_report, needs_client=False)
+
+    parser_serve = subparsers.add_parser('serve', help='Run sync, diff and retrieve jobs submitted to a local HTTP API, keeping Strigo connections, configs and scripts warm between jobs')
+    parser_serve.add_argument('--port', default=8765, type=int, help='Local port of the API (default: %(default)s)')
+    parser_serve.add_argument('--socket', type=Path, help='Unix socket of the API, instead of the port')
+    parser_serve.add_argument('--jobs', '-j', default=4, type=int, help='Number of jobs run concurrently, by as many worker processes (default: %(default)s)')
+    parser_serve.add_argument('--refresh', default=60.0, type=float, help='Seconds during which configs and scripts referencing a git branch are reused (default: %(default)s)')
+    parser_serve.set_defaults(func=serve, needs_client=False)
+
+    parser_bench = subparsers.add_parser('bench', help='Measure the throughput, latencies and errors of read requests to the Strigo API')
+    parser_bench.add_argument('--mix', default=parse_mix(DEFAULT_MIX), type=_bench_mix, help=f"Weights of the requests among classes, class, resources and notes (default: {DEFAULT_MIX})")
+    parser_bench.add_argument('--workers', '-w', default=8, type=int, help='Number of concurrent workers (default: %(default)s)')
+    parser_bench.add_argument('--requests', '-n', type=int, help='Number of requests to send (default: 200 unless --duration is given)')
+    parser_bench.add_argument('--duration', type=float, help='Seconds during which requests are sent')
+    parser_bench.add_argument('--class', dest='class_ids', action='append', metavar='CLASS_ID', help='Class to request (can be repeated, default: all the classes of the organization)')
+    parser_bench.add_argument('--seed', type=int, help='Seed of the random choice of requests, for reproducible mixes')
+    parser_bench.add_argument('--json', action='store_true', help='Output the results as a JSON line, e.g. to track them over time')
+    parser_bench.set_defaults(func=bench, needs_client=False)
+
+    return parser
 
-    strigo_org_id = os.environ.get('STRIGO_ORG_ID', None)
-    strigo_api_key = os.environ.get('STRIGO_API_KEY', None)
-    if strigo_org_id is None or strigo_api_key is None:
-        print("Environnement variables 'STRIGO_ORG_ID' or 'STRIGO_API_KEY' for Strigo authentication are not set")
-        if strigo_org_id is None:
-            strigo_org_id = input('Please enter Strigo Organization ID: ')
-        if strigo_api_key is None:
-            strigo_api_key = getpass('Please enter Strigo API key: ')
-    client = Client(strigo_org_id, strigo_api_key)
+
+def main() -> None:
+    args = _parser().parse_args()
+
+    client = None
+    if getattr(args, 'needs_client', True):
+        client = _new_client(args, *_credentials())
+
+    if args.deadline:
+        deadline.start(args.deadline)
 
     try:
-        args.func(client, args)
+        if args.profile or args.profile_out or args.profile_memory:
+            _run_profiled(client, args)
+        else:
+            args.func(client, args)
     except Exception as e:
         import traceback
         traceback.print_exc(limit=None if os.environ.get('DEBUG', False) else 0)
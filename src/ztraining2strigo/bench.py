@@ -0,0 +1,134 @@
+# coding: utf8
+from __future__ import annotations
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from strigo.api import classes as classes_api
+from strigo.api import presentations as presentations_api
+from strigo.api import resources as resources_api
+from strigo.client import Client
+from strigo.scheduler import EndpointStats
+
+DEFAULT_MIX = 'classes=1,class=4,resources=4,notes=2'
+
+
+@dataclass
+class BenchTarget:
+    class_id: str
+    presentation_ids: List[str] = field(default_factory=list)
+
+
+def _notes(client: Client, target: BenchTarget, rng: random.Random) -> Any:
+    return presentations_api.get_notes(client, target.class_id, rng.choice(target.presentation_ids))
+
+
+# Read-only requests of the mix, on a random target
+REQUESTS: Dict[str, Callable[[Client, BenchTarget, random.Random], Any]] = {
+    'classes': lambda client, target, rng: classes_api.list(client),
+    'class': lambda client, target, rng: classes_api.get(client, target.class_id),
+    'resources': lambda client, target, rng: resources_api.list(client, target.class_id),
+    'notes': _notes,
+}
+
+
+def parse_mix(mix: str) -> Dict[str, int]:
+    """Weights of the requests of a mix like `class=4,notes=1`, raise ValueError if it is invalid"""
+    weights = {}
+    for part in (p.strip() for p in mix.split(',') if p.strip()):
+        name, _, weight = part.partition('=')
+        if name not in REQUESTS:
+            raise ValueError(f"Unknown request '{name}', expected one of {', '.join(REQUESTS)}")
+        weights[name] = int(weight or 1)
+        if weights[name] < 0:
+            raise ValueError(f"Negative weight for request '{name}'")
+    if not any(weights.values()):
+        raise ValueError('The mix has no request')
+    return weights
+
+
+def find_targets(client: Client, class_ids: Optional[List[str]] = None, with_presentations: bool = True) -> List[BenchTarget]:
+    """Classes to request, all the classes of the organization by default"""
+    class_ids = class_ids or [c.id for c in classes_api.list(client)]
+    targets = [BenchTarget(class_id) for class_id in class_ids]
+    if with_presentations:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            for target, presentations in zip(targets, executor.map(lambda t: presentations_api.list(client, t.class_id), targets)):
+                target.presentation_ids = [p.id for p in presentations]
+    return targets
+
+
+def run_bench(client: Client, targets: List[BenchTarget], weights: Dict[str, int], workers: int, requests: Optional[int] = None, duration: Optional[float] = None, seed: Optional[int] = None) -> float:
+    """Send `requests` requests of the mix (or during `duration` seconds) from `workers` concurrent workers, and return the wall time.
+
+    Latencies and errors are recorded by the client, per endpoint.
+    """
+    if not targets:
+        raise Exception('No class to request')
+    with_notes = [t for t in targets if t.presentation_ids]
+    if weights.get('notes') and not with_notes:
+        raise Exception('No class with a presentation to request notes of')
+    names = [n for n, w in weights.items() if w]
+    lock = threading.Lock()
+    sent = 0
+    start = time.perf_counter()
+
+    def take() -> bool:
+        nonlocal sent
+        with lock:
+            if requests is not None and sent >= requests:
+                return False
+            sent += 1
+        return duration is None or time.perf_counter() - start < duration
+
+    def work(worker: int) -> None:
+        rng = random.Random(None if seed is None else seed + worker)
+        while take():
+            name = rng.choices(names, [weights[n] for n in names])[0]
+            target = rng.choice(with_notes if name == 'notes' else targets)
+            try:
+                REQUESTS[name](client, target, rng)
+            except Exception:
+                pass  # Counted in the errors of the endpoint
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(work, range(workers)))
+    return time.perf_counter() - start
+
+
+def bench_summary(stats: Dict[str, EndpointStats], wall_time: float) -> Dict[str, Any]:
+    endpoints = {}
+    for name, s in sorted(stats.items()):
+        endpoints[name] = {
+            'requests': s.requests,
+            'throughput': s.requests / wall_time if wall_time else 0.0,
+            'error_rate': s.errors / s.requests if s.requests else 0.0,
+            'retries': s.retries,
+            'throttled': s.throttled,
+            'p50': s.percentile(50),
+            'p90': s.percentile(90),
+            'p99': s.percentile(99),
+            'max': max(s.latencies, default=0.0),
+        }
+    total = sum(s.requests for s in stats.values())
+    errors = sum(s.errors for s in stats.values())
+    return {
+        'wall_time': wall_time,
+        'requests': total,
+        'throughput': total / wall_time if wall_time else 0.0,
+        'error_rate': errors / total if total else 0.0,
+        'endpoints': endpoints,
+    }
+
+
+def bench_report(summary: Dict[str, Any]) -> str:
+    lines = [f"{'Endpoint':<44} {'Count':>6} {'Req/s':>7} {'Errors':>7} {'429/503':>7} {'p50 (s)':>8} {'p90 (s)':>8} {'p99 (s)':>8} {'max (s)':>8}"]
+    for name, e in summary['endpoints'].items():
+        lines.append(f"{name:<44} {e['requests']:>6} {e['throughput']:>7.1f} {e['error_rate']:>7.1%} {e['throttled']:>7} {e['p50']:>8.3f} {e['p90']:>8.3f} {e['p99']:>8.3f} {e['max']:>8.3f}")
+    lines.append(f"{'all':<44} {summary['requests']:>6} {summary['throughput']:>7.1f} {summary['error_rate']:>7.1%}")
+    lines.append(f"Wall time: {summary['wall_time']:.2f}s")
+    return '\n'.join(lines) + '\n'
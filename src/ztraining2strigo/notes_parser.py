@@ -2,37 +2,58 @@
 
 import json
 import re
+from concurrent.futures import Executor
 from pathlib import Path
 from typing import List
 
 from strigo.api.presentations import Note
+from strigo.profiling import phase
 
 SLIDE_SEP_RE = re.compile(r'\r?\n\r?\n\r?\n\r?\n')
 NOTES_SEP_RE = re.compile(r'\r?\nNotes : *\r?\n')
 
 
-def parse_notes(notes_source: Path) -> List[Note]:
-
+def list_slides_files(notes_source: Path) -> List[Path]:
     if not notes_source.exists():
         raise Exception(f"Notes source file '{notes_source.absolute()}' does not exists'")
 
     with notes_source.open() as f:
         slides_list = json.load(f)
 
-    notes = []
-    page = 1
+    slides_files = []
     for slides_file in slides_list:
         slides_file: Path = notes_source.parent / slides_file
         if not slides_file.exists():
             raise Exception(f"Slide file '${slides_file.absolute()}' does not exists'")
+        slides_files.append(slides_file)
+    return slides_files
+
 
-        with slides_file.open() as f:
-            slides = f.read()
-        for slide in SLIDE_SEP_RE.split(slides.strip()):
-            if re.search(NOTES_SEP_RE, slide):
-                note = re.split(NOTES_SEP_RE, slide)[1].strip()
+def parse_slides_file(slides_file: Path) -> List[str]:
+    """Return the note of each slide of the file, empty if the slide has no note"""
+    with slides_file.open() as f:
+        slides = f.read()
+    notes = []
+    for slide in SLIDE_SEP_RE.split(slides.strip()):
+        note = ''
+        if re.search(NOTES_SEP_RE, slide):
+            note = re.split(NOTES_SEP_RE, slide)[1].strip()
+        notes.append(note)
+    return notes
+
+
+def parse_notes(notes_source: Path, executor: Executor = None) -> List[Note]:
+    with phase('notes parse'):
+        slides_files = list_slides_files(notes_source)
+        # Executor.map keeps the files order so pages numbering stays deterministic
+        notes_per_file = executor.map(parse_slides_file, slides_files) if executor else map(parse_slides_file, slides_files)
+
+        notes = []
+        page = 1
+        for slides_notes in notes_per_file:
+            for note in slides_notes:
                 if note:
                     notes.append(Note(page, note))
-            page += 1
+                page += 1
 
-    return notes
+        return notes
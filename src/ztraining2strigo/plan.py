@@ -0,0 +1,569 @@
+# coding: utf8
+from __future__ import annotations
+
+import json
+import math
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import asdict, dataclass, field
+from difflib import unified_diff
+from itertools import zip_longest
+from pathlib import Path
+from typing import Any, ClassVar, Dict, List, Optional, Tuple, Type, Union
+
+from strigo.api import UNDEFINED, UNDEFINED_TYPE
+from strigo.api import classes as classes_api
+from strigo.api import presentations as presentations_api
+from strigo.api import resources as resources_api
+from strigo import deadline
+from strigo.cache import write_atomically
+from strigo.client import Client
+from strigo.configs.classes import ClassConfig
+from strigo.configs.presentations import PresentationConfig
+from strigo.configs.resources import ResourceConfig
+from strigo.deadline import Deadline
+from strigo.models.classes import Class
+from strigo.models.presentations import Note, Presentation
+from strigo.models.resources import Resource, ViewInterface, WebviewLink
+from strigo.profiling import phase
+from strigo.scripts import decompress_script, is_compressed_script
+
+from .prepare import LocalState
+from .scope import SyncScope
+from .snapshot import RemoteSnapshot
+
+PLAN_FORMAT_VERSION = 1
+
+
+def _show_diff(a: str, b: str, prefix: str = '\t') -> None:
+    diff_lines = unified_diff(
+        [] if not a else a.splitlines(keepends=True),
+        [] if not b else b.splitlines(keepends=True),
+        fromfile='strigo', tofile='local'
+    )
+    sys.stdout.writelines(prefix + line for line in diff_lines)
+
+
+def _dict_to_display(d: Dict[str, Any]) -> str:
+    return '\n'.join(sorted(f"{k}: {v}" for k, v in d.items())) + '\n'
+
+
+@dataclass
+class Operation:
+    type: ClassVar[str]
+    result_type: ClassVar[Optional[Type]] = None  # Of the results used by other operations, kept in journals
+
+    id: str
+    depends_on: List[str] = field(default_factory=list)
+
+    @property
+    def message(self) -> str:
+        raise NotImplementedError
+
+    def apply(self, client: Client, class_id: str, results: Dict[str, Any]) -> Any:
+        raise NotImplementedError
+
+    @property
+    def is_stale(self) -> bool:
+        """Whether the local files the operation was planned from changed since, so that it cannot be applied anymore"""
+        return False
+
+    def result_to_dict(self, result: Any) -> Any:
+        return result.to_dict() if self.result_type and result is not None else None
+
+    def result_from_dict(self, d: Any) -> Any:
+        return self.result_type.from_dict(d) if self.result_type and d is not None else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'type': self.type, **asdict(self)}
+
+    @staticmethod
+    def from_dict(d: Dict[str, Any]) -> Operation:
+        d = dict(d)
+        return _OPERATIONS[d.pop('type')](**d)
+
+
+@dataclass
+class UpdateClass(Operation):
+    type: ClassVar[str] = 'update_class'
+    result_type: ClassVar[Optional[Type]] = Class
+
+    name: str = ''
+    description: Optional[str] = None  # None when not defined in config
+    labels: Optional[List[str]] = None  # None when not defined in config
+
+    @property
+    def message(self) -> str:
+        return 'Updating class'
+
+    def apply(self, client: Client, class_id: str, results: Dict[str, Any]) -> Any:
+        return classes_api.update(client, class_id, self.name, self.description or UNDEFINED, self.labels or UNDEFINED)
+
+
+@dataclass
+class DeletePresentation(Operation):
+    type: ClassVar[str] = 'delete_presentation'
+
+    presentation_id: str = ''
+    filename: str = ''
+
+    @property
+    def message(self) -> str:
+        return f"Deleting existing presentation with id {self.presentation_id} of file {self.filename}"
+
+    def apply(self, client: Client, class_id: str, results: Dict[str, Any]) -> Any:
+        presentations_api.delete(client, class_id, self.presentation_id)
+
+
+@dataclass
+class UploadPresentation(Operation):
+    type: ClassVar[str] = 'upload_presentation'
+    result_type: ClassVar[Optional[Type]] = Presentation
+
+    file: str = ''
+    md5: str = ''
+    replaces: Optional[str] = None  # Id of the presentation replaced by this one
+    fingerprint: Optional[str] = None  # Of the file, recorded in the sync state once uploaded
+
+    @property
+    def message(self) -> str:
+        return f"{'Updating' if self.replaces else 'Creating'} presentation {self.file}"
+
+    @property
+    def is_stale(self) -> bool:
+        try:
+            return bool(self.md5) and PresentationConfig(self.file).file_md5_sum() != self.md5
+        except OSError:
+            return True
+
+    def apply(self, client: Client, class_id: str, results: Dict[str, Any]) -> Any:
+        if self.is_stale:
+            raise Exception(f"Presentation file '{self.file}' changed since the plan was computed")
+        return presentations_api.create(client, class_id, Path(self.file))
+
+
+@dataclass
+class CreateNotes(Operation):
+    type: ClassVar[str] = 'create_notes'
+
+    file: str = ''
+    notes: List[Dict[str, Any]] = field(default_factory=list)
+    presentation_id: Optional[str] = None  # Either an existing presentation
+    uploaded_by: Optional[str] = None  # Or the one uploaded by this operation
+
+    @property
+    def message(self) -> str:
+        return f"Updating presentation notes for {self.file}"
+
+    def apply(self, client: Client, class_id: str, results: Dict[str, Any]) -> Any:
+        presentation_id = self.presentation_id or results[self.uploaded_by].id
+        return presentations_api.create_notes(client, class_id, presentation_id, [Note.from_dict(dict(n)) for n in self.notes])
+
+
+def _resource_fields(resource: ResourceConfig, init_script: str, post_launch_script: str) -> Dict[str, Any]:
+    """Arguments of the resources API, UNDEFINED ones are left out"""
+    image = resource.image
+    fields = {
+        'name': resource.name,
+        'image_id': image.id,
+        'image_user': image.user,
+        'view_interface': resource.view_interface.value if resource.view_interface else None,
+        'webview_links': [w.to_dict() for w in resource.webview_links],
+        'ec2_region': image.region,
+        'instance_type': resource.instance_type,
+        'image_region_mapping': image.region_mapping
+    }
+    if post_launch_script:
+        fields['post_launch_script'] = post_launch_script
+    if init_script:
+        fields['userdata'] = init_script
+    return fields
+
+
+def _compression_summary(init_script: Union[str, UNDEFINED_TYPE]) -> str:
+    if init_script is UNDEFINED or not is_compressed_script(init_script):
+        return ''
+    return f" (compressed from {len(decompress_script(init_script).encode('utf-8'))} to {len(init_script.encode('utf-8'))} bytes)"
+
+
+def _resource_arguments(fields: Dict[str, Any]) -> Dict[str, Any]:
+    arguments = {k: fields.get(k, UNDEFINED) for k in ('post_launch_script', 'userdata', 'ec2_region', 'instance_type', 'image_region_mapping')}
+    arguments['view_interface'] = ViewInterface(fields['view_interface']) if fields['view_interface'] else None
+    arguments['webview_links'] = [WebviewLink.from_dict(dict(w)) for w in fields['webview_links']]
+    return {'name': fields['name'], 'image_id': fields['image_id'], 'image_user': fields['image_user'], **arguments}
+
+
+@dataclass
+class CreateResource(Operation):
+    type: ClassVar[str] = 'create_resource'
+
+    index: int = 0
+    fields: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def message(self) -> str:
+        return f"Creating machine {self.index} named {self.fields['name']}"
+
+    def apply(self, client: Client, class_id: str, results: Dict[str, Any]) -> Any:
+        return resources_api.create(client, class_id, **_resource_arguments(self.fields))
+
+
+@dataclass
+class UpdateResource(Operation):
+    type: ClassVar[str] = 'update_resource'
+
+    index: int = 0
+    resource_id: str = ''
+    fields: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def message(self) -> str:
+        return f"Updating machine {self.index} named {self.fields['name']}"
+
+    def apply(self, client: Client, class_id: str, results: Dict[str, Any]) -> Any:
+        return resources_api.update(client, class_id, self.resource_id, **_resource_arguments(self.fields))
+
+
+@dataclass
+class DeleteResource(Operation):
+    type: ClassVar[str] = 'delete_resource'
+
+    index: int = 0
+    resource_id: str = ''
+    name: str = ''
+
+    @property
+    def message(self) -> str:
+        return f"Deleting machine {self.index} named {self.name}"
+
+    def apply(self, client: Client, class_id: str, results: Dict[str, Any]) -> Any:
+        resources_api.delete(client, class_id, self.resource_id)
+
+
+_OPERATIONS: Dict[str, Type[Operation]] = {o.type: o for o in (UpdateClass, DeletePresentation, UploadPresentation, CreateNotes, CreateResource, UpdateResource, DeleteResource)}
+
+
+@dataclass
+class Plan:
+    class_id: str
+    operations: List[Operation] = field(default_factory=list)
+
+    def add(self, operation: Operation) -> Operation:
+        self.operations.append(operation)
+        return operation
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'version': PLAN_FORMAT_VERSION, 'class_id': self.class_id, 'operations': [o.to_dict() for o in self.operations]}
+
+    @staticmethod
+    def from_dict(d: Dict[str, Any]) -> Plan:
+        if d.get('version') != PLAN_FORMAT_VERSION:
+            raise Exception(f"Unsupported plan version: {d.get('version')}")
+        return Plan(d['class_id'], [Operation.from_dict(o) for o in d['operations']])
+
+    def write(self, plan_path: Path) -> None:
+        with plan_path.open('w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+            f.write('\n')
+
+    @staticmethod
+    def load(plan_path: Path) -> Plan:
+        with plan_path.open() as f:
+            return Plan.from_dict(json.load(f))
+
+
+def _plan_class(plan: Plan, config: ClassConfig, remote: RemoteSnapshot) -> None:
+    existing_class = remote.cls
+    needs_update = False
+    if config.name != existing_class.name:
+        print(f"Will update class name from {existing_class.name} to {config.name}")
+        needs_update = True
+    if config.strigo_description and config.strigo_description != existing_class.str_description:
+        print("Will update class description")
+        _show_diff(existing_class.str_description + '\n', config.strigo_description + '\n')
+        needs_update = True
+    if config.labels and set(config.labels) != set(existing_class.labels):
+        print("Will update class labels")
+        _show_diff('\n'.join(sorted(existing_class.labels)) + '\n', '\n'.join(sorted(config.labels)) + '\n')
+        needs_update = True
+    if needs_update:
+        plan.add(UpdateClass('class', name=config.name, description=config.strigo_description or None, labels=config.labels or None))
+
+
+def _plan_presentations(plan: Plan, config: ClassConfig, remote: RemoteSnapshot, local: LocalState, scope: SyncScope, sync_state: Optional[SyncState]) -> None:
+    existing_presentations_per_filename: Dict[str, Presentation] = {}
+    duplicates: List[Presentation] = []  # Left by an interrupted replacement, the latest upload is kept
+    for presentation in sorted(remote.presentations, key=lambda p: p.upload_date, reverse=True):
+        if presentation.filename in existing_presentations_per_filename:
+            duplicates.append(presentation)
+        else:
+            existing_presentations_per_filename[presentation.filename] = presentation
+    presentations_per_filename = {Path(p.file).name: p for p in config.presentations}
+    deletions = []
+    if scope.presentation_files:
+        for presentation in (p for p in remote.presentations if p.filename not in presentations_per_filename):
+            deletions.append(plan.add(DeletePresentation(f"delete-presentation-{presentation.id}", presentation_id=presentation.id, filename=presentation.filename)).id)
+        for presentation in (p for p in duplicates if p.filename in presentations_per_filename):
+            plan.add(DeletePresentation(f"delete-presentation-{presentation.id}", presentation_id=presentation.id, filename=presentation.filename))
+        for filename, presentation in ((f, p) for f, p in presentations_per_filename.items() if f not in existing_presentations_per_filename):
+            local_presentation = local.presentations[presentation.file]
+            upload = plan.add(UploadPresentation(f"upload-presentation-{filename}", deletions, file=presentation.file, md5=local_presentation.file_md5_sum, fingerprint=local_presentation.file_fingerprint))
+            if local_presentation.notes is not None:
+                plan.add(CreateNotes(f"notes-{filename}", [upload.id], file=presentation.file, notes=[n.to_dict() for n in local_presentation.notes], uploaded_by=upload.id))
+    for filename, presentation, existing_presentation in ((f, p, existing_presentations_per_filename[f]) for f, p in presentations_per_filename.items() if f in existing_presentations_per_filename):
+        local_presentation = local.presentations[presentation.file]
+        notes = local_presentation.notes
+        needs_update = False
+        if scope.presentation_files:
+            needs_update = local_presentation.file_size != existing_presentation.size_bytes or local_presentation.file_md5_sum != existing_presentation.md5
+            if sync_state and local_presentation.file_fingerprint:
+                if not needs_update:
+                    sync_state.record(presentation.file, existing_presentation.md5, local_presentation.file_fingerprint)
+                elif sync_state.is_uploaded(presentation.file, existing_presentation.md5, local_presentation.file_fingerprint):
+                    print(f"Presentation {presentation.file} only differs from Strigo by its PDF metadata, not uploaded again")
+                    needs_update = False
+        if needs_update:
+            upload = plan.add(UploadPresentation(f"upload-presentation-{filename}", file=presentation.file, md5=local_presentation.file_md5_sum, replaces=existing_presentation.id, fingerprint=local_presentation.file_fingerprint))
+            if notes is not None:
+                plan.add(CreateNotes(f"notes-{filename}", [upload.id], file=presentation.file, notes=[n.to_dict() for n in notes], uploaded_by=upload.id))
+            # Deleted once replaced, so that the class is never left without the presentation
+            plan.add(DeletePresentation(f"delete-presentation-{existing_presentation.id}", [upload.id], presentation_id=existing_presentation.id, filename=existing_presentation.filename))
+        elif scope.notes and notes is not None and notes != remote.notes[existing_presentation.id]:
+            plan.add(CreateNotes(f"notes-{filename}", file=presentation.file, notes=[n.to_dict() for n in notes], presentation_id=existing_presentation.id))
+
+
+def _plan_resources(plan: Plan, config: ClassConfig, remote: RemoteSnapshot, local: LocalState, scope: SyncScope, diff: bool) -> None:
+    previous_creation: Optional[str] = None
+    for index, (resource, existing_resource) in enumerate(zip_longest(config.resources, remote.resources)):
+        resource: ResourceConfig
+        existing_resource: Resource
+        if not scope.includes_resource(index):
+            continue
+        if resource is None:
+            plan.add(DeleteResource(f"delete-resource-{index}", index=index, resource_id=existing_resource.id, name=existing_resource.name))
+            continue
+
+        image = resource.image
+        init_script = local.resources[index].init_script or UNDEFINED
+        post_launch_script = local.resources[index].post_launch_script or UNDEFINED
+        fields = _resource_fields(resource, init_script, post_launch_script)
+
+        if existing_resource is None:
+            if resource.compress_init_scripts and init_script:
+                print(f"Will create machine {index} with init script{_compression_summary(init_script)}")
+            # Machines are matched by position, so they must be created in order
+            creation = plan.add(CreateResource(f"create-resource-{index}", [previous_creation] if previous_creation else [], index=index, fields=fields))
+            previous_creation = creation.id
+            continue
+
+        needs_update = False
+        if resource.name != existing_resource.name:
+            print(f"Will update machine {index} name from {existing_resource.name} to {resource.name}")
+            needs_update = True
+        if resource.instance_type != existing_resource.instance_type:
+            print(f"Will update machine {index} type from {existing_resource.instance_type} to {resource.instance_type}")
+            needs_update = True
+        if image.region_mapping != existing_resource.image_region_mapping:
+            print(f"Will update machine {index} images")
+            if diff:
+                _show_diff(_dict_to_display(existing_resource.image_region_mapping), _dict_to_display(image.region_mapping))
+            needs_update = True
+        if image.user != existing_resource.image_user:
+            print(f"Will update machine {index} image user from {existing_resource.image_user} to {image.user}")
+            needs_update = True
+        if init_script != existing_resource.userdata and (init_script or existing_resource.userdata):
+            print(f"Will update machine {index} init script{_compression_summary(init_script)}")
+            if diff:
+                _show_diff(decompress_script(existing_resource.userdata), decompress_script(init_script))
+            needs_update = True
+        if post_launch_script != existing_resource.post_launch_script and (post_launch_script or existing_resource.post_launch_script):
+            print(f"Will update machine {index} post launch script")
+            if diff:
+                _show_diff(existing_resource.post_launch_script, post_launch_script)
+            needs_update = True
+        if resource.view_interface is not None and resource.view_interface != existing_resource.view_interface:
+            print(f"Will update machine {index} view interface from {existing_resource.view_interface.value} to {resource.view_interface.value}")
+            needs_update = True
+        if resource.webview_links != existing_resource.webview_links:
+            print(f"Will update machine {index} webview links")
+            needs_update = True
+        if needs_update:
+            plan.add(UpdateResource(f"update-resource-{index}", index=index, resource_id=existing_resource.id, fields=fields))
+
+
+def build_plan(config: ClassConfig, remote: RemoteSnapshot, local: LocalState, scope: SyncScope = None, diff: bool = False, sync_state: Optional[SyncState] = None) -> Plan:
+    """Compare the config with the remote snapshot, printing the differences, and return the operations to apply.
+
+    With a sync state (and fingerprints in the local state), presentations whose fingerprint is the one uploaded are not uploaded again.
+    """
+    scope = scope or SyncScope.full()
+    plan = Plan(remote.cls.id)
+    with phase('diff'):
+        if scope.class_fields:
+            _plan_class(plan, config, remote)
+        if scope.presentations:
+            _plan_presentations(plan, config, remote, local, scope, sync_state)
+        if scope.resources is None or scope.resources:
+            _plan_resources(plan, config, remote, local, scope, diff)
+    return plan
+
+
+JOURNAL_FORMAT_VERSION = 1
+
+
+class Journal:
+    """Write-ahead journal of the application of a plan: the plan, then the operations started and applied with their results.
+
+    A plan interrupted before being fully applied is resumed from the journal, as long as its `fingerprint` (of the config or plan file) is unchanged.
+    """
+
+    def __init__(self, path: Path, fingerprint: str) -> None:
+        self.path = path
+        self._fingerprint = fingerprint
+
+    @staticmethod
+    def next_to(path: Path, fingerprint: str) -> Journal:
+        return Journal(path.with_name(f".{path.name}.journal"), fingerprint)
+
+    def resume(self) -> Optional[Tuple[Plan, Dict[str, Any], List[Operation]]]:
+        """The interrupted plan, the results of its applied operations, and the operations interrupted while applied"""
+        try:
+            with self.path.open() as f:
+                lines = f.read().splitlines()
+            header = json.loads(lines[0])
+        except (OSError, ValueError, IndexError):
+            return None
+        if header.get('version') != JOURNAL_FORMAT_VERSION or header.get('fingerprint') != self._fingerprint:
+            return None
+        plan = Plan.from_dict(header['plan'])
+        operations = {o.id: o for o in plan.operations}
+        started: Dict[str, Operation] = {}
+        results: Dict[str, Any] = {}
+        for line in lines[1:]:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break  # Last line cut by the interruption
+            operation = operations[entry['id']]
+            if entry['event'] == 'started':
+                started[operation.id] = operation
+            else:
+                results[operation.id] = operation.result_from_dict(entry['result'])
+        return plan, results, [o for i, o in started.items() if i not in results]
+
+    def start(self, plan: Plan) -> None:
+        header = {'version': JOURNAL_FORMAT_VERSION, 'fingerprint': self._fingerprint, 'plan': plan.to_dict()}
+        write_atomically(self.path, (json.dumps(header) + '\n').encode('utf-8'))
+
+    def _append(self, entry: Dict[str, Any]) -> None:
+        with self.path.open('a') as f:
+            f.write(json.dumps(entry) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def started(self, operation: Operation) -> None:
+        self._append({'event': 'started', 'id': operation.id})
+
+    def applied(self, operation: Operation, result: Any) -> None:
+        self._append({'event': 'applied', 'id': operation.id, 'result': operation.result_to_dict(result)})
+
+    def finish(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+
+SYNC_STATE_FORMAT_VERSION = 1
+
+
+class SyncState:
+    """Fingerprints of the presentation files uploaded, with the MD5 of their upload in Strigo.
+
+    A PDF file built again has new dates and ids in its metadata, so a new MD5, but the same fingerprint: it is not uploaded again as long as Strigo has the upload of this fingerprint.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._changed = False
+        try:
+            with path.open() as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        self._presentations: Dict[str, Dict[str, str]] = state.get('presentations', {}) if state.get('version') == SYNC_STATE_FORMAT_VERSION else {}
+
+    @staticmethod
+    def next_to(config_path: Path) -> SyncState:
+        return SyncState(config_path.with_name(f".{config_path.name}.sync"))
+
+    def is_uploaded(self, file: str, md5: str, fingerprint: str) -> bool:
+        return self._presentations.get(file) == {'md5': md5, 'fingerprint': fingerprint}
+
+    def record(self, file: str, md5: str, fingerprint: str) -> None:
+        if not self.is_uploaded(file, md5, fingerprint):
+            self._presentations[file] = {'md5': md5, 'fingerprint': fingerprint}
+            self._changed = True
+
+    def record_uploads(self, plan: Plan, results: Dict[str, Any]) -> None:
+        for operation in plan.operations:
+            if isinstance(operation, UploadPresentation) and operation.fingerprint and operation.id in results:
+                self.record(operation.file, results[operation.id].md5, operation.fingerprint)
+
+    def save(self) -> None:
+        if self._changed:
+            state = {'version': SYNC_STATE_FORMAT_VERSION, 'presentations': self._presentations}
+            write_atomically(self.path, (json.dumps(state, indent=2, sort_keys=True) + '\n').encode('utf-8'))
+            self._changed = False
+
+
+def _apply_operation(operation: Operation, client: Client, class_id: str, results: Dict[str, Any], operation_deadline: Optional[Deadline]) -> Any:
+    with deadline.scope(operation_deadline):
+        return operation.apply(client, class_id, results)
+
+
+def apply_plan(client: Client, plan: Plan, jobs: int = 4, messages_prefix: str = '', journal: Optional[Journal] = None, results: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Apply the operations, running concurrently those whose dependencies are done, and return their results.
+
+    With a deadline, each operation gets its share of the remaining time, and no operation is started once it is exceeded.
+    With a journal (started with the plan), the operations are recorded in it, and the operations of `results` (resumed from it) are skipped.
+    """
+    results = dict(results or {})
+    pending = {o.id: o for o in plan.operations if o.id not in results}
+    running: Dict[Future, Operation] = {}
+    failures: List[str] = []
+    command_deadline = deadline.current()
+    with phase('writes'), ThreadPoolExecutor(max_workers=jobs) as executor:
+        while pending or running:
+            # Stop starting operations after a failure
+            if not failures and not (command_deadline and command_deadline.expired):
+                for operation in [o for o in pending.values() if all(d in results for d in o.depends_on)]:
+                    if len(running) >= jobs:
+                        break  # Started when a worker is free, so that its deadline share starts with it
+                    del pending[operation.id]
+                    print(f"{messages_prefix}{operation.message}")
+                    if journal:
+                        journal.started(operation)
+                    # The operations left run by batches of `jobs`
+                    operation_deadline = command_deadline.share(math.ceil((len(pending) + len(running) + 1) / jobs)) if command_deadline else None
+                    running[executor.submit(_apply_operation, operation, client, plan.class_id, results, operation_deadline)] = operation
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                operation = running.pop(future)
+                try:
+                    results[operation.id] = future.result()
+                except Exception as e:
+                    failures.append(f"{operation.message}: {e}")
+                else:
+                    if journal:
+                        journal.applied(operation, results[operation.id])
+    if failures or pending:
+        not_applied = f", {len(pending)} operations not applied" if pending else ''
+        if command_deadline and command_deadline.expired and pending:
+            failures.append(f"Deadline of {command_deadline.seconds:.1f}s exceeded, not applied: " + ', '.join(o.message for o in pending.values()))
+        if journal:
+            not_applied += f", run again to resume from '{journal.path.as_posix()}'"
+        raise Exception(f"Failed to apply plan{not_applied}:\n" + '\n'.join(failures or ['Unresolvable dependencies']))
+    if journal:
+        journal.finish()
+    return results
@@ -0,0 +1,92 @@
+# coding: utf8
+from __future__ import annotations
+
+import os
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from strigo.configs.classes import ClassConfig
+from strigo.configs.presentations import PresentationConfig
+from strigo.configs.resources import ResourceConfig
+from strigo.models.presentations import Note
+from strigo.profiling import phase
+
+from .notes_parser import list_slides_files, parse_notes
+from .scope import SyncScope
+
+# Below this number of slides files, starting worker processes costs more than parsing
+_PROCESS_POOL_MIN_SLIDES_FILES = 32
+
+
+def default_jobs() -> int:
+    return os.cpu_count() or 1
+
+
+@dataclass
+class LocalPresentation:
+    file_size: Optional[int] = None
+    file_md5_sum: Optional[str] = None
+    file_fingerprint: Optional[str] = None  # Only when asked for
+    notes: Optional[List[Note]] = None
+
+
+@dataclass
+class LocalResource:
+    init_script: str
+    post_launch_script: str
+
+
+@dataclass
+class LocalState:
+    presentations: Dict[str, LocalPresentation] = field(default_factory=dict)  # Per presentation file
+    resources: Dict[int, LocalResource] = field(default_factory=dict)  # Per resource index
+
+
+def _file_info(presentation: PresentationConfig, fingerprint: bool = False) -> LocalPresentation:
+    return LocalPresentation(presentation.file_size(), presentation.file_md5_sum(), presentation.file_fingerprint() if fingerprint else None)
+
+
+def _resource_scripts(resource: ResourceConfig) -> LocalResource:
+    with phase('scripts assembly'):
+        return LocalResource(resource.unique_init_script(), resource.unique_post_launch_script())
+
+
+def prepare_local_state(config: ClassConfig, scope: SyncScope = None, jobs: int = None, fingerprints: bool = False) -> LocalState:
+    """Compute checksums (and PDF fingerprints if asked for), notes and scripts needed by the scope concurrently, results are collected in config order"""
+    scope = scope or SyncScope.full()
+    jobs = jobs or default_jobs()
+
+    notes_sources = {p.file: Path(p.notes_source) for p in config.presentations if p.notes_source} if scope.presentations else {}
+    notes_executor = None
+    if jobs > 1 and sum(len(list_slides_files(n)) for n in notes_sources.values()) >= _PROCESS_POOL_MIN_SLIDES_FILES:
+        notes_executor = ProcessPoolExecutor(max_workers=jobs)
+
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            file_infos: Dict[str, Future[LocalPresentation]] = {}
+            notes: Dict[str, Future[List[Note]]] = {}
+            resources: Dict[int, Future[LocalResource]] = {}
+
+            if scope.presentation_files:
+                for presentation in config.presentations:
+                    file_infos[presentation.file] = executor.submit(_file_info, presentation, fingerprints)
+            for file, notes_source in notes_sources.items():
+                notes[file] = executor.submit(parse_notes, notes_source, notes_executor)
+            for index, resource in enumerate(config.resources):
+                if scope.includes_resource(index):
+                    resources[index] = executor.submit(_resource_scripts, resource)
+
+            state = LocalState()
+            for presentation in config.presentations:
+                local_presentation = file_infos[presentation.file].result() if presentation.file in file_infos else LocalPresentation()
+                if presentation.file in notes:
+                    local_presentation.notes = notes[presentation.file].result()
+                state.presentations[presentation.file] = local_presentation
+            for index, future in resources.items():
+                state.resources[index] = future.result()
+    finally:
+        if notes_executor:
+            notes_executor.shutdown()
+    return state
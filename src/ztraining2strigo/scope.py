@@ -0,0 +1,40 @@
+# coding: utf8
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Optional, Set
+
+
+@dataclass
+class SyncScope:
+    class_fields: bool = True
+    presentation_files: bool = True
+    notes: bool = True
+    resources: Optional[Set[int]] = None  # None means all resources
+
+    @property
+    def presentations(self) -> bool:
+        return self.presentation_files or self.notes
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.class_fields and not self.presentations and self.resources is not None and not self.resources
+
+    def includes_resource(self, index: int) -> bool:
+        return self.resources is None or index in self.resources
+
+    def merge(self, other: SyncScope) -> SyncScope:
+        return SyncScope(
+            class_fields=self.class_fields or other.class_fields,
+            presentation_files=self.presentation_files or other.presentation_files,
+            notes=self.notes or other.notes,
+            resources=None if self.resources is None or other.resources is None else self.resources | other.resources
+        )
+
+    @staticmethod
+    def full() -> SyncScope:
+        return SyncScope()
+
+    @staticmethod
+    def empty() -> SyncScope:
+        return SyncScope(class_fields=False, presentation_files=False, notes=False, resources=set())
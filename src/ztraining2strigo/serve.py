@@ -0,0 +1,259 @@
+# coding: utf8
+from __future__ import annotations
+
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import re
+import socketserver
+import stat
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import asdict, dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Collection, Dict, List, Optional, Tuple, Union
+
+# Command line arguments of each job command
+JOB_COMMANDS = {
+    'sync': ['update'],
+    'diff': ['update', '--dry-run', '--diff'],
+    'retrieve': ['retrieve'],
+}
+
+_JOB_PATH = re.compile(r'/jobs/(\w+)')
+
+RunJob = Callable[[List[str]], None]
+
+
+@dataclass
+class Job:
+    id: str
+    command: str
+    directory: str
+    arguments: List[str]
+    status: str = 'queued'  # Then running, and succeeded or failed
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    exit_code: Optional[int] = None
+    output: str = ''
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in ('succeeded', 'failed')
+
+    def to_dict(self, output: bool = True) -> Dict[str, Any]:
+        d = asdict(self)
+        if not output:
+            del d['output']
+        return d
+
+
+def job_arguments(request: Dict[str, Any]) -> List[str]:
+    """Command line arguments of a job request, raise ValueError if it is invalid"""
+    command = request.get('command')
+    if command not in JOB_COMMANDS:
+        raise ValueError(f"'command' must be one of {', '.join(JOB_COMMANDS)}")
+    arguments = ['--config', str(request.get('config') or 'strigo.json'), *JOB_COMMANDS[command]]
+    if command == 'retrieve':
+        if not request.get('class_id'):
+            raise ValueError("'class_id' is required to retrieve a class")
+        arguments.append(str(request['class_id']))
+    elif request.get('since'):
+        arguments += ['--since', str(request['since'])]
+    return arguments
+
+
+def run_job(run: RunJob, directory: str, arguments: List[str]) -> Tuple[int, str]:
+    """Run the command of a job in a worker process, from its directory, and return its exit code and output"""
+    output = io.StringIO()
+    exit_code = 0
+    previous_directory = os.getcwd()
+    os.chdir(directory)  # Paths of configs are relative to the working directory
+    try:
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+            try:
+                run(arguments)
+            except SystemExit as e:  # Commands exit on invalid arguments or missing files
+                exit_code = e.code if isinstance(e.code, int) else int(e.code is not None)
+            except Exception:
+                traceback.print_exc(limit=None if os.environ.get('DEBUG', False) else 0)
+                exit_code = 1
+    finally:
+        os.chdir(previous_directory)
+    return exit_code, output.getvalue()
+
+
+class JobQueue:
+    """Jobs run by `jobs` worker processes keeping their state warm from one job to the next, one job at a time per config file.
+
+    Worker processes are started with `initializer(*initargs)`, and run the jobs with `run(arguments)`.
+    They are started right away, and never forked from the threads of the server: a forked thread could hold a lock forever.
+    """
+
+    def __init__(self, jobs: int, run: RunJob, initializer: Callable[..., None], initargs: Tuple[Any, ...] = (), keep: int = 100) -> None:
+        self._run = run
+        context = multiprocessing.get_context('forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+        self._new_executor = lambda: ProcessPoolExecutor(max_workers=jobs, mp_context=context, initializer=initializer, initargs=initargs)
+        self._executor = self._new_executor()
+        for future in [self._executor.submit(os.getpid) for _ in range(jobs)]:
+            future.result()
+        self._slots = threading.Semaphore(jobs)
+        self._keep = keep
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Job] = {}
+        self._config_locks: Dict[str, threading.Lock] = {}
+
+    def submit(self, request: Dict[str, Any]) -> Job:
+        """Queue the job of a request, raise ValueError if it is invalid"""
+        arguments = job_arguments(request)
+        directory = Path(str(request.get('directory') or ''))
+        if not directory.is_absolute() or not directory.is_dir():
+            raise ValueError("'directory' must be the absolute path of an existing directory")
+        job = Job(uuid.uuid4().hex[:12], request['command'], str(directory), arguments)
+        config_path = (directory / str(request.get('config') or 'strigo.json')).resolve()
+        with self._lock:
+            self._jobs[job.id] = job
+            finished = [j.id for j in self._jobs.values() if j.is_finished]
+            for job_id in finished[:max(0, len(finished) - self._keep)]:
+                del self._jobs[job_id]
+            config_lock = self._config_locks.setdefault(str(config_path), threading.Lock())
+        threading.Thread(target=self._process, args=(job, config_lock), daemon=True).start()
+        return job
+
+    def _process(self, job: Job, config_lock: threading.Lock) -> None:
+        # Concurrent jobs of a config file would compete to update the same class
+        with config_lock, self._slots:
+            job.started_at = time.time()
+            job.status = 'running'
+            executor = self._executor
+            try:
+                job.exit_code, job.output = executor.submit(run_job, self._run, job.directory, job.arguments).result()
+            except BrokenProcessPool:
+                job.exit_code, job.output = 1, 'Worker process terminated abruptly\n'
+                with self._lock:
+                    if self._executor is executor:
+                        self._executor = self._new_executor()
+            except Exception as e:
+                job.exit_code, job.output = 1, f"{type(e).__name__}: {e}\n"
+            job.finished_at = time.time()
+            job.status = 'succeeded' if job.exit_code == 0 else 'failed'
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(cancel_futures=True)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: Union[JobServer, 'UnixJobServer']
+
+    def address_string(self) -> str:
+        return self.client_address[0] if self.client_address else 'local'  # Empty for Unix sockets
+
+    def _reply(self, status: int, data: Any, headers: Dict[str, str] = {}) -> None:
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _from_browser(self) -> bool:
+        # Browsers send the origin of cross-origin requests, and the host of the page when a DNS name of the page is rebound to this address,
+        # the API is not meant for web pages
+        host = self.headers.get('Host')
+        if self.headers.get('Origin') is None and (host is None or self.server.allowed_hosts is None or host.lower() in self.server.allowed_hosts):
+            return False
+        self._reply(403, {'error': 'Requests from web pages are not allowed'})
+        return True
+
+    def do_GET(self) -> None:
+        if self._from_browser():
+            return
+        if self.path == '/jobs':
+            return self._reply(200, [job.to_dict(output=False) for job in self.server.queue.list()])
+        match = _JOB_PATH.fullmatch(self.path)
+        job = self.server.queue.get(match.group(1)) if match else None
+        if job is None:
+            return self._reply(404, {'error': 'Not found'})
+        self._reply(200, job.to_dict())
+
+    def do_POST(self) -> None:
+        if self._from_browser():
+            return
+        if self.path != '/jobs':
+            return self._reply(404, {'error': 'Not found'})
+        # Unlike JSON ones, other requests (e.g. text/plain) can be sent cross-origin by web pages without preflight
+        if self.headers.get_content_type() != 'application/json':
+            return self._reply(415, {'error': 'Content-Type must be application/json'})
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            if not isinstance(request, dict):
+                raise ValueError('A job must be a JSON object')
+            job = self.server.queue.submit(request)
+        except ValueError as e:
+            return self._reply(400, {'error': str(e)})
+        self._reply(202, job.to_dict(output=False), {'Location': f"/jobs/{job.id}"})
+
+
+class JobServer(ThreadingHTTPServer):
+    """HTTP API queuing jobs, on a local TCP port"""
+
+    daemon_threads = True
+
+    def __init__(self, queue: JobQueue, address: Tuple[str, int] = ('127.0.0.1', 0)) -> None:
+        super().__init__(address, _Handler)
+        self.queue = queue
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def allowed_hosts(self) -> Optional[Collection[str]]:
+        """Values of the Host header of requests sent to the bound address"""
+        host, port = self.server_address[:2]
+        hosts = {host, 'localhost'} if host in ('127.0.0.1', '::1') else {host}
+        return {f"[{h}]:{port}" if ':' in h else f"{h}:{port}" for h in hosts}
+
+
+if hasattr(socketserver, 'UnixStreamServer'):  # Not on Windows
+    class UnixJobServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        """HTTP API queuing jobs, on a Unix socket"""
+
+        daemon_threads = True
+
+        def __init__(self, queue: JobQueue, path: Path) -> None:
+            if path.exists() and stat.S_ISSOCK(path.stat().st_mode):
+                path.unlink()  # Left by a previous server
+            super().__init__(str(path), _Handler)
+            self.queue = queue
+
+        @property
+        def endpoint(self) -> str:
+            return f"unix:{self.server_address}"
+
+        @property
+        def allowed_hosts(self) -> Optional[Collection[str]]:
+            return None  # Any, web pages cannot reach Unix sockets
+
+        def server_close(self) -> None:
+            super().server_close()
+            with contextlib.suppress(OSError):
+                os.unlink(self.server_address)
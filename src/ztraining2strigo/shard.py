@@ -0,0 +1,86 @@
+# coding: utf8
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from strigo.cache import write_atomically
+from strigo.configs.classes import load_raw_config
+
+# Estimated cost of an update never recorded, in seconds
+_BASE_COST = 2.0
+_COST_PER_MACHINE = 1.0
+_MIB = 1024 * 1024
+_UPLOAD_BYTES_PER_SECOND = 2 * _MIB
+
+
+def parse_shard(shard: str) -> Tuple[int, int]:
+    """INDEX/COUNT, with INDEX from 1 to COUNT"""
+    index, _, count = shard.partition('/')
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid shard '{shard}', expected INDEX/COUNT (e.g. 1/4)")
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"Invalid shard '{shard}', INDEX must be between 1 and COUNT")
+    return index, count
+
+
+def config_key(config_path: Path) -> str:
+    # As given, so that it is the same on all the nodes whatever their checkout directory
+    return config_path.as_posix()
+
+
+class UpdateCosts:
+    """Durations of the last updates of config files, to balance shards"""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        try:
+            with path.open() as f:
+                self._durations: Dict[str, Any] = json.load(f)
+        except (OSError, ValueError):
+            self._durations = {}
+
+    def record(self, config_path: Path, duration: float) -> None:
+        self._durations[config_key(config_path)] = {'duration': round(duration, 3), 'recorded_at': time.time()}
+
+    def save(self) -> None:
+        write_atomically(self.path, (json.dumps(self._durations, indent=2, sort_keys=True) + '\n').encode('utf-8'))
+
+    def cost(self, config_path: Path) -> float:
+        """The last recorded duration of the update of the config, otherwise an estimate from its presentations sizes and machines count"""
+        recorded = self._durations.get(config_key(config_path))
+        if isinstance(recorded, dict) and isinstance(recorded.get('duration'), (int, float)):
+            return float(recorded['duration'])
+        return estimate_cost(config_path)
+
+
+def estimate_cost(config_path: Path) -> float:
+    try:
+        raw_config = load_raw_config(config_path)
+    except Exception:
+        return _BASE_COST  # Reported by the update
+    presentations_size = 0
+    for presentation in raw_config.get('presentations', []):
+        try:
+            # In MiB, so that small differences between builds of the file on different nodes don't change the split
+            presentations_size += math.ceil((config_path.parent / presentation['file']).stat().st_size / _MIB) * _MIB
+        except (OSError, KeyError, TypeError):
+            pass
+    return _BASE_COST + len(raw_config.get('resources', [])) * _COST_PER_MACHINE + presentations_size / _UPLOAD_BYTES_PER_SECOND
+
+
+def split_shards(costs: Dict[str, float], count: int) -> List[List[str]]:
+    """Deterministic split of the keys in `count` shards of balanced total costs: the costliest first, each to the least loaded shard (LPT)"""
+    shards: List[List[str]] = [[] for _ in range(count)]
+    loads = [0.0] * count
+    for key in sorted(costs, key=lambda k: (-costs[k], k)):
+        least_loaded = min(range(count), key=lambda i: (loads[i], i))
+        shards[least_loaded].append(key)
+        loads[least_loaded] += costs[key]
+    return shards
@@ -0,0 +1,49 @@
+# coding: utf8
+from __future__ import annotations
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from strigo.api import classes as classes_api
+from strigo.api import presentations as presentations_api
+from strigo.api import resources as resources_api
+from strigo.client import Client
+from strigo.models.classes import Class
+from strigo.models.presentations import Note, Presentation
+from strigo.models.resources import Resource
+from strigo.profiling import phase
+
+from .scope import SyncScope
+
+
+@dataclass
+class RemoteSnapshot:
+    cls: Class
+    presentations: List[Presentation] = field(default_factory=list)
+    notes: Dict[str, List[Note]] = field(default_factory=dict)  # Per presentation id
+    resources: List[Resource] = field(default_factory=list)
+
+
+def _presentations_with_notes(client: Client, class_id: str, with_notes: bool, executor: ThreadPoolExecutor) -> Tuple[List[Presentation], Dict[str, List[Note]]]:
+    presentations = presentations_api.list(client, class_id)
+    notes: Dict[str, Future[List[Note]]] = {}
+    if with_notes:
+        notes = {p.id: executor.submit(presentations_api.get_notes, client, class_id, p.id) for p in presentations}
+    return presentations, {i: n.result() for i, n in notes.items()}
+
+
+def fetch_snapshot(client: Client, class_id: str, scope: SyncScope = None, existing_class: Optional[Class] = None) -> RemoteSnapshot:
+    """Fetch the remote state needed by the scope concurrently, only the notes wait for the presentations list"""
+    scope = scope or SyncScope.full()
+    with phase('remote reads'), ThreadPoolExecutor(max_workers=4) as executor:
+        cls = executor.submit(classes_api.get, client, class_id) if existing_class is None else None
+        presentations = executor.submit(_presentations_with_notes, client, class_id, scope.notes, executor) if scope.presentations else None
+        resources = executor.submit(resources_api.list, client, class_id) if scope.resources is None or scope.resources else None
+
+        snapshot = RemoteSnapshot(existing_class if cls is None else cls.result())
+        if presentations:
+            snapshot.presentations, snapshot.notes = presentations.result()
+        if resources:
+            snapshot.resources = resources.result()
+    return snapshot
@@ -0,0 +1,111 @@
+# coding: utf8
+from __future__ import annotations
+
+import json
+import subprocess
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, Optional, Set, Tuple
+
+from strigo.configs.classes import ClassConfig
+from strigo.scripts.configs import LocalScript, flatten_scripts
+
+from .scope import SyncScope
+
+_FileState = Optional[Tuple[int, int]]
+
+
+def _slides_files(notes_source: Path) -> Iterator[Path]:
+    try:
+        with notes_source.open() as f:
+            slides_list = json.load(f)
+    except (OSError, ValueError):
+        return  # Missing or being edited, will be reported on sync
+    for slides_file in slides_list:
+        yield notes_source.parent / slides_file
+
+
+def watched_paths(config_path: Path, config: ClassConfig) -> Dict[Path, SyncScope]:
+    paths: Dict[Path, SyncScope] = {config_path: SyncScope.full()}
+
+    def add(path: Path, scope: SyncScope) -> None:
+        paths[path] = paths[path].merge(scope) if path in paths else scope
+
+    for presentation in config.presentations:
+        add(Path(presentation.file), SyncScope(class_fields=False, presentation_files=True, notes=False, resources=set()))
+        if not presentation.notes_source:
+            continue
+        notes_source = Path(presentation.notes_source)
+        notes_scope = SyncScope(class_fields=False, presentation_files=False, notes=True, resources=set())
+        add(notes_source, notes_scope)
+        for slides_file in _slides_files(notes_source):
+            add(slides_file, notes_scope)
+    for index, resource in enumerate(config.resources):
+        resource_scope = SyncScope(class_fields=False, presentation_files=False, notes=False, resources={index})
+        for script in flatten_scripts(resource.init_scripts + resource.post_launch_scripts):
+            if isinstance(script, LocalScript):
+                add(Path(script.path), resource_scope)
+    return paths
+
+
+def listing_paths(config_path: Path, config: ClassConfig) -> Set[Path]:
+    """The watched files listing other files to watch: the config and the listings of slides"""
+    return {config_path} | {Path(p.notes_source) for p in config.presentations if p.notes_source}
+
+
+def _git(*args: str) -> str:
+    result = subprocess.run(['git', *args], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise Exception(f"git {' '.join(args)} failed: {result.stderr.strip()}")
+    return result.stdout
+
+
+def git_changed_paths(ref: str) -> Set[Path]:
+    """Files of the working tree differing from the git `ref`, committed or not, and untracked files"""
+    top_level = Path(_git('rev-parse', '--show-toplevel').strip())
+    names = _git('diff', '--name-only', '--no-renames', '-z', ref, '--').split('\0')
+    names += _git('ls-files', '--others', '--exclude-standard', '--full-name', '-z').split('\0')
+    return {(top_level / name).resolve() for name in names if name}
+
+
+def git_ignored_paths(paths: Iterable[Path]) -> Set[Path]:
+    """Those of `paths` ignored by git (e.g. built presentation files), whose changes `git_changed_paths` cannot see"""
+    result = subprocess.run(['git', 'check-ignore', '-z', '--stdin'], input='\0'.join(str(p) for p in paths), capture_output=True, text=True)
+    if result.returncode not in (0, 1):  # 1 when none is ignored
+        raise Exception(f"git check-ignore failed: {result.stderr.strip()}")
+    return {Path(name).resolve() for name in result.stdout.split('\0') if name}
+
+
+def changes_scope(paths: Dict[Path, SyncScope], changed_paths: Set[Path]) -> SyncScope:
+    """The scope to synchronize for the `changed_paths` among the watched `paths`"""
+    scope = SyncScope.empty()
+    for path, path_scope in paths.items():
+        if path.resolve() in changed_paths:
+            scope = scope.merge(path_scope)
+    return scope
+
+
+def _file_state(path: Path) -> _FileState:
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def watch_changes(get_paths: Callable[[], Set[Path]], debounce: float = 1.0, interval: float = 0.25) -> Iterator[Set[Path]]:
+    """Poll the files given by `get_paths` and yield batches of changed files once they are quiet for `debounce` seconds"""
+    previous = {p: _file_state(p) for p in get_paths()}
+    pending: Set[Path] = set()
+    last_change = 0.0
+    while True:
+        time.sleep(interval)
+        current = {p: _file_state(p) for p in get_paths()}
+        changed = {p for p, state in current.items() if p in previous and previous[p] != state}
+        previous = current
+        if changed:
+            pending |= changed
+            last_change = time.monotonic()
+        elif pending and time.monotonic() - last_change >= debounce:
+            yield pending
+            pending = set()
@@ -0,0 +1,229 @@
+# coding: utf8
+"""In-memory stand-in for the Strigo API, with configurable latency and throttling, to exercise the client in tests and locally:
+
+    python tests/standin.py --port 8080 --rate 10
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+_PATH = re.compile(r'/classes(?:/(\w+))?(?:/(presentations|resources)(?:/(\w+))?(?:/(notes))?)?')
+_UPLOAD = re.compile(rb'filename="([^"]+)"\r\nContent-Type: [^\r]*\r\n\r\n(.*)\r\n--\w+--$', re.S)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+
+def _new_id() -> str:
+    return uuid.uuid4().hex[:17]
+
+
+class _TokenBucket:
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self._rate = rate
+        self._burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self) -> Optional[float]:
+        """None when the request is allowed, otherwise the seconds to wait for a token"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return None
+            return (1 - self._tokens) / self._rate
+
+
+class StandinState:
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.classes: Dict[str, Dict[str, Any]] = {}
+        self.presentations: Dict[str, List[Dict[str, Any]]] = {}
+        self.notes: Dict[str, List[Dict[str, Any]]] = {}
+        self.resources: Dict[str, List[Dict[str, Any]]] = {}
+
+    def add_class(self, name: str, description: str = '', labels: Sequence[str] = ()) -> Dict[str, Any]:
+        class_id = _new_id()
+        self.classes[class_id] = {'id': class_id, 'name': name, 'description': description, 'labels': list(labels),
+                                  'created_at': _now(), 'updated_at': _now(), 'presentation_notes': []}
+        self.presentations[class_id] = []
+        self.resources[class_id] = []
+        return self.classes[class_id]
+
+    def full_class(self, class_id: str) -> Dict[str, Any]:
+        return dict(self.classes[class_id], resources=self.resources[class_id])
+
+
+class StandinServer(ThreadingHTTPServer):
+    """Strigo API stand-in, throttling requests beyond `rate` per second (bursts of `burst`) with 429 and Retry-After"""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int] = ('127.0.0.1', 0), latency: float = 0.0, rate: float = 0.0, burst: int = 10, etags: bool = True) -> None:
+        super().__init__(address, _Handler)
+        self.state = StandinState()
+        self.latency = latency
+        self.etags = etags
+        self._bucket = _TokenBucket(rate, burst) if rate > 0 else None
+        self.requests = 0
+        self.throttled = 0
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/api/v1"
+
+    def start(self) -> StandinServer:
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def admit(self) -> Optional[float]:
+        with self.state.lock:
+            self.requests += 1
+        wait = self._bucket.take() if self._bucket else None
+        if wait is not None:
+            with self.state.lock:
+                self.throttled += 1
+        return wait
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True  # Headers and body are sent separately, delayed ACKs would add 40 ms
+    server: StandinServer
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _reply(self, status: int, data: Any = None, headers: Optional[Dict[str, str]] = None) -> None:
+        body = b'' if status == 204 else json.dumps({'result': 'success', 'data': data}).encode('utf-8')
+        if status == 404:
+            body = json.dumps({'result': 'failure', 'error': {'type': 'NotFound', 'message': 'Not found'}}).encode('utf-8')
+        headers = dict(headers or {})
+        if self.server.etags and self.command == 'GET' and status == 200:
+            etag = f'"{hashlib.md5(body).hexdigest()}"'
+            headers['ETag'] = etag
+            if self.headers.get('If-None-Match') == etag:
+                status, body = 304, b''
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if body:
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self) -> bytes:
+        if self.headers.get('Transfer-Encoding') == 'chunked':
+            data = b''
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return data
+                data += self.rfile.read(size)
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def _handle(self) -> None:
+        body = self._body()
+        wait = self.server.admit()
+        if wait is not None:
+            return self._reply(429, headers={'Retry-After': str(math.ceil(wait))})
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        match = _PATH.fullmatch(self.path.split('?')[0].split('/api/v1', 1)[-1])
+        if not match:
+            return self._reply(404)
+        with self.server.state.lock:
+            self._route(self.server.state, self.command, *match.groups(), json.loads(body) if body and not self.headers.get('Content-Type', '').startswith('multipart/') else body)
+
+    def _route(self, state: StandinState, method: str, class_id: Optional[str], kind: Optional[str], sub_id: Optional[str], notes: Optional[str], data: Any) -> None:
+        if class_id and class_id not in state.classes:
+            return self._reply(404)
+        if kind is None:
+            if class_id is None:
+                if method == 'POST':
+                    return self._reply(200, state.add_class(data['name'], data.get('description', ''), data.get('labels', [])))
+                return self._reply(200, [state.full_class(c) for c in state.classes])
+            if method == 'DELETE':
+                del state.classes[class_id]
+                return self._reply(204)
+            if method == 'PATCH':
+                state.classes[class_id].update(data, updated_at=_now())
+            return self._reply(200, state.full_class(class_id))
+        if kind == 'presentations':
+            presentations = state.presentations[class_id]
+            if notes:
+                if method == 'POST':
+                    state.notes[sub_id] = data['notes']
+                return self._reply(200, state.notes.get(sub_id, []))
+            if sub_id is None:
+                if method == 'POST':
+                    upload = _UPLOAD.search(data)
+                    content = upload.group(2)
+                    presentation = {'id': _new_id(), 'class_id': class_id, 'md5': hashlib.md5(content).hexdigest(), 'upload_date': _now(),
+                                    'size_bytes': len(content), 'filename': upload.group(1).decode('utf-8'), 'content_type': ['application/pdf']}
+                    presentations.append(presentation)
+                    return self._reply(200, presentation)
+                return self._reply(200, presentations)
+            if method == 'DELETE':
+                state.presentations[class_id] = [p for p in presentations if p['id'] != sub_id]
+                state.notes.pop(sub_id, None)
+                return self._reply(204)
+            return self._reply(200, next((p for p in presentations if p['id'] == sub_id), None))
+        resources = state.resources[class_id]
+        if sub_id is None:
+            if method == 'POST':
+                resource = {'id': _new_id(), 'type': 'ec2', 'is_custom_image': False, 'webview_links': [], **data}
+                resources.append(resource)
+                return self._reply(200, resource)
+            return self._reply(200, resources)
+        resource = next((r for r in resources if r['id'] == sub_id), None)
+        if resource is None:
+            return self._reply(404)
+        if method == 'DELETE':
+            resources.remove(resource)
+            return self._reply(204)
+        if method == 'PATCH':
+            resource.update(data)
+        return self._reply(200, resource)
+
+    do_GET = do_POST = do_PATCH = do_DELETE = _handle
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve an in-memory stand-in of the Strigo API")
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to each request")
+    parser.add_argument('--rate', type=float, default=0.0, help="Requests per second before throttling with 429, unlimited by default")
+    parser.add_argument('--burst', type=int, default=10, help="Requests allowed in a burst when throttling")
+    args = parser.parse_args()
+    server = StandinServer(('127.0.0.1', args.port), args.latency, args.rate, args.burst)
+    print(f"Serving a Strigo API stand-in on {server.endpoint}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
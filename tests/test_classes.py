@@ -0,0 +1,31 @@
+# coding: utf8
+import json
+from pathlib import Path
+
+from strigo.configs.classes import ClassConfig
+
+
+def _load(tmp_path: Path, resource: dict) -> ClassConfig:
+    config_path = tmp_path / 'strigo.json'
+    config_path.write_text(json.dumps({'id': 'class-id', 'name': 'Training', 'presentations': [], 'resources': [resource]}))
+    return ClassConfig.load(config_path)
+
+
+def test_default_options_are_not_written(tmp_path):
+    config = _load(tmp_path, {'name': 'machine', 'instance_type': 't3.medium', 'image': 'ubuntu-22.04'})
+
+    config.write(tmp_path / 'written.json')
+
+    written = json.loads((tmp_path / 'written.json').read_text())
+    assert 'compress_init_scripts' not in written['resources'][0]
+    assert 'instrument_init_scripts' not in written['resources'][0]
+
+
+def test_set_options_are_written(tmp_path):
+    config = _load(tmp_path, {'name': 'machine', 'instance_type': 't3.medium', 'image': 'ubuntu-22.04', 'compress_init_scripts': True, 'instrument_init_scripts': True})
+
+    config.write(tmp_path / 'written.json')
+
+    written = json.loads((tmp_path / 'written.json').read_text())
+    assert written['resources'][0]['compress_init_scripts'] is True
+    assert written['resources'][0]['instrument_init_scripts'] is True
@@ -0,0 +1,45 @@
+# coding: utf8
+import tarfile
+
+import pytest
+
+from strigo.scripts.github import _library_dir, _safe_members
+
+
+def _member(name: str, type: bytes = tarfile.REGTYPE, linkname: str = '') -> tarfile.TarInfo:
+    member = tarfile.TarInfo(name)
+    member.type = type
+    member.linkname = linkname
+    member.mode = 0o4777
+    return member
+
+
+def test_safe_members_are_extracted_without_special_permissions():
+    members = _safe_members([_member('lib'), _member('lib/script.sh'), _member('lib/link.sh', tarfile.SYMTYPE, 'script.sh')])
+
+    assert [m.mode & 0o7777 for m in members] == [0o755, 0o755, 0o755]
+
+
+@pytest.mark.parametrize('member', [
+    _member('/etc/passwd'),
+    _member('lib/../../outside'),
+    _member('lib/link', tarfile.SYMTYPE, '../../outside'),
+    _member('lib/link', tarfile.SYMTYPE, '/etc/passwd'),
+    _member('lib/device', tarfile.CHRTYPE),
+])
+def test_unsafe_members_are_rejected(member):
+    with pytest.raises(tarfile.TarError):
+        _safe_members([member])
+
+
+def test_stored_versions_are_only_used_when_enabled(tmp_path, monkeypatch):
+    monkeypatch.delenv('Z2S_SCRIPTS_LIB_DIR', raising=False)
+    monkeypatch.delenv('Z2S_SCRIPTS_LIB_BUNDLES', raising=False)
+    monkeypatch.setenv('Z2S_SCRIPTS_LIB_STORE', str(tmp_path))
+    (tmp_path / 'v1.2.0').mkdir()
+
+    assert _library_dir('v1.2.0') is None
+
+    monkeypatch.setenv('Z2S_SCRIPTS_LIB_BUNDLES', 'true')
+    assert _library_dir('v1.2.0') == tmp_path / 'v1.2.0'
+    assert _library_dir('main') is None
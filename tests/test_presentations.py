@@ -0,0 +1,46 @@
+# coding: utf8
+import random
+from hashlib import sha256
+
+import pytest
+
+import strigo.configs.presentations
+from strigo.configs.presentations import _VOLATILE_PDF_METADATA, PresentationConfig
+
+
+def _pdf(build: int) -> bytes:
+    random.seed(0)
+    parts = [b'%PDF-1.5\n']
+    for index in range(200):
+        parts.append(b'%d 0 obj\nstream\n' % index + random.randbytes(random.randrange(200)) + b'\nendstream\nendobj\n')
+        if index % 50 == 0:
+            parts.append(b'<< /CreationDate (D:2026%04d) /ModDate <%04d> >>\n' % (build, build))
+            parts.append(b'<xmp:ModifyDate>2026-%04d</xmp:ModifyDate> xmpMM:InstanceID="uuid:%04d"\n' % (build, build))
+    parts.append(b'trailer\n<< /ID [<%04d> <%04d>] >>\n%%%%EOF\n' % (build, build))
+    return b''.join(parts)
+
+
+def _whole_file_fingerprint(content: bytes) -> str:
+    for pattern in _VOLATILE_PDF_METADATA:
+        content = pattern.sub(rb'\1', content)
+    return sha256(content).hexdigest()
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 100, 1024 * 1024])
+def test_fingerprint_is_computed_by_chunks(tmp_path, monkeypatch, chunk_size):
+    monkeypatch.setattr(strigo.configs.presentations, '_FINGERPRINT_CHUNK_SIZE', chunk_size)
+    monkeypatch.setattr(strigo.configs.presentations, '_MAX_METADATA_SIZE', 64)
+    (tmp_path / 'first.pdf').write_bytes(_pdf(1))
+    (tmp_path / 'second.pdf').write_bytes(_pdf(2))
+
+    fingerprint = PresentationConfig(str(tmp_path / 'first.pdf')).file_fingerprint()
+
+    assert fingerprint == _whole_file_fingerprint(_pdf(1))
+    assert fingerprint == PresentationConfig(str(tmp_path / 'second.pdf')).file_fingerprint()
+    assert _pdf(1) != _pdf(2)
+
+
+def test_fingerprint_of_empty_file(tmp_path):
+    (tmp_path / 'empty.pdf').write_bytes(b'')
+
+    assert PresentationConfig(str(tmp_path / 'empty.pdf')).file_fingerprint() == sha256(b'').hexdigest()
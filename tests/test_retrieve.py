@@ -0,0 +1,28 @@
+# coding: utf8
+import argparse
+from pathlib import Path
+
+from strigo.client import Client
+from ztraining2strigo import retrieve
+from standin import StandinServer
+
+
+def test_retrieve_twice_leaves_files_unchanged(tmp_path, monkeypatch, capsys):
+    server = StandinServer().start()
+    try:
+        class_id = server.state.add_class('Training', 'Description')['id']
+        server.state.resources[class_id].append({'id': 'resource-id', 'type': 'ec2', 'name': 'machine', 'image_id': 'ami-0123456789abcdef0', 'image_user': 'ubuntu',
+                                                 'is_custom_image': True, 'ec2_region': 'eu-west-1', 'instance_type': 't3.medium', 'webview_links': [],
+                                                 'userdata': '#!/bin/bash\necho hello\n'})
+        client = Client('organization', 'key', server.endpoint)
+        args = argparse.Namespace(class_id=class_id, all=False, label=None, config=Path('strigo.json'), ignore=[])
+        monkeypatch.chdir(tmp_path)
+
+        retrieve(client, args)
+        assert "(2 created, 0 updated, 0 unchanged)" in capsys.readouterr().out
+
+        retrieve(client, args)
+        assert "(0 created, 0 updated, 2 unchanged)" in capsys.readouterr().out
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,42 @@
+# coding: utf8
+from concurrent.futures import ThreadPoolExecutor
+
+from strigo.api import classes as classes_api
+from strigo.client import Client
+from strigo.scheduler import AdaptiveLimiter, RequestScheduler
+from standin import StandinServer
+
+
+def test_concurrent_requests_are_paced_once_throttled():
+    server = StandinServer(rate=20, burst=5).start()
+    try:
+        class_id = server.state.add_class('Training')['id']
+        scheduler = RequestScheduler(AdaptiveLimiter(16, 16, 16), max_retries=2)
+        client = Client('organization', 'key', server.endpoint, scheduler=scheduler)
+
+        def get_class(_: int) -> str:
+            return classes_api.get(client, class_id).id
+
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            assert list(executor.map(get_class, range(48))) == [class_id] * 48
+        assert scheduler.interval > 0
+        assert server.throttled < 48
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_slow_uploads_do_not_decrease_the_limit():
+    limiter = AdaptiveLimiter(8)
+    for latency in (0.01, 0.01):
+        limiter.acquire()
+        limiter.release(latency, throttled=False)
+    limit = limiter.limit
+
+    limiter.acquire()
+    limiter.release(None, throttled=False)  # A 30 s upload
+    assert limiter.limit == limit
+
+    limiter.acquire()
+    limiter.release(None, throttled=True)
+    assert limiter.limit == limit / 2
@@ -0,0 +1,57 @@
+# coding: utf8
+import shutil
+import subprocess
+
+import pytest
+
+import strigo.scripts
+from strigo.scripts import is_instrumented_script, uninstrument_script, unique_script
+from strigo.scripts.configs import LocalScript, ParallelScripts
+
+
+def _run_bootstrap(tmp_path, monkeypatch, scripts, instrument, serial=()):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(strigo.scripts, 'BOOT_TIMINGS_FILE', str(tmp_path / 'boot.jsonl'))
+    for name, content in scripts.items():
+        (tmp_path / name).write_text(content)
+    parallel_scripts = ParallelScripts([LocalScript(name) for name in scripts if name not in serial])
+    bootstrap = unique_script([parallel_scripts] + [LocalScript(name) for name in serial], is_windows=False, instrument=instrument)
+    return subprocess.run(['bash', '-c', bootstrap], capture_output=True, text=True)
+
+
+@pytest.mark.skipif(shutil.which('bash') is None, reason='Requires bash')
+@pytest.mark.parametrize('instrument', [False, True])
+def test_failing_parallel_job_is_reported(tmp_path, monkeypatch, instrument):
+    result = _run_bootstrap(tmp_path, monkeypatch, {'ok.sh': 'echo ok\n', 'failing.sh': 'echo failing\nexit 3\n'}, instrument)
+    assert '--------- Failed failing.sh (exit 3)' in result.stdout
+    assert 'Failed ok.sh' not in result.stdout
+
+
+@pytest.mark.skipif(shutil.which('bash') is None, reason='Requires bash')
+@pytest.mark.parametrize('instrument', [False, True])
+def test_failing_parallel_job_does_not_stop_bootstrap(tmp_path, monkeypatch, instrument):
+    result = _run_bootstrap(tmp_path, monkeypatch, {'failing.sh': 'false\n', 'ok.sh': 'echo ok\n', 'next.sh': 'echo next\n'}, instrument, serial=['next.sh'])
+    assert '--------- Failed failing.sh (exit 1)' in result.stdout
+    assert result.stdout.index('Failed failing.sh') < result.stdout.index('next')
+
+
+@pytest.mark.skipif(shutil.which('bash') is None, reason='Requires bash')
+@pytest.mark.parametrize('instrument', [False, True])
+def test_succeeding_parallel_sections_succeed(tmp_path, monkeypatch, instrument):
+    result = _run_bootstrap(tmp_path, monkeypatch, {'first.sh': 'echo first\n', 'second.sh': 'echo second\n'}, instrument)
+    assert result.returncode == 0
+    assert result.stdout.index('first') < result.stdout.index('second')
+
+
+@pytest.mark.parametrize('is_windows', [False, True])
+def test_uninstrument_script_restores_uninstrumented_script(tmp_path, monkeypatch, is_windows):
+    monkeypatch.chdir(tmp_path)
+    for name in ('first', 'second', 'third'):
+        (tmp_path / name).write_text(f"echo {name}\n")
+    scripts = [LocalScript('first'), ParallelScripts([LocalScript('second'), LocalScript('third')])]
+    script = unique_script(scripts, is_windows)
+    instrumented_script = unique_script(scripts, is_windows, instrument=True)
+
+    assert is_instrumented_script(instrumented_script, is_windows)
+    assert not is_instrumented_script(script, is_windows)
+    assert uninstrument_script(instrumented_script, is_windows) == script
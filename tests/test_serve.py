@@ -0,0 +1,57 @@
+# coding: utf8
+import http.client
+import threading
+import time
+from typing import List
+
+import pytest
+
+from ztraining2strigo.serve import JobQueue, JobServer
+
+
+def _init_worker() -> None:
+    pass
+
+
+def _print_arguments(arguments: List[str]) -> None:
+    print(' '.join(arguments))
+
+
+def test_jobs_run_in_worker_processes(tmp_path):
+    queue = JobQueue(2, _print_arguments, _init_worker)
+    try:
+        job = queue.submit({'command': 'diff', 'directory': str(tmp_path)})
+        for _ in range(100):
+            if job.is_finished:
+                break
+            time.sleep(0.05)
+        assert job.status == 'succeeded'
+        assert job.output == '--config strigo.json update --dry-run --diff\n'
+    finally:
+        queue.shutdown()
+
+
+class _EmptyQueue:
+
+    def list(self) -> list:
+        return []
+
+
+@pytest.fixture
+def server():
+    server = JobServer(_EmptyQueue())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize('host, status', [
+    ('127.0.0.1', 200),
+    ('localhost', 200),
+    ('evil.example', 403),
+])
+def test_requests_to_other_hosts_are_rejected(server, host, status):
+    connection = http.client.HTTPConnection(*server.server_address[:2])
+    connection.request('GET', '/jobs', headers={'Host': f"{host}:{server.server_address[1]}"})
+    assert connection.getresponse().status == status
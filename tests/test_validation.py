@@ -0,0 +1,55 @@
+# coding: utf8
+import json
+from pathlib import Path
+
+from strigo.configs.classes import ClassConfig
+from strigo.configs.validation import validate_config_file
+
+PACKAGED_SCHEMA = Path(__file__).parents[1] / 'src' / 'strigo' / 'configs' / 'strigo.schema.json'
+PUBLISHED_SCHEMA = Path(__file__).parents[1] / 'strigo.schema.json'  # Referenced by the $schema of configs
+
+
+def _write_config(root: Path, config: dict) -> Path:
+    (root / 'pdf').mkdir()
+    (root / 'pdf' / 'Slides.pdf').write_bytes(b'%PDF-1.4\n')
+    config_path = root / 'strigo.json'
+    config_path.write_text(json.dumps(config))
+    return config_path
+
+
+def test_valid_config_with_only_required_keys_loads(tmp_path):
+    config_path = _write_config(tmp_path, {
+        'id': 'class-id',
+        'name': 'Training',
+        'presentations': [{'file': 'pdf/Slides.pdf', 'notes_source': None}],
+        'resources': [
+            {'name': 'machine', 'instance_type': 't3.medium', 'image': 'ubuntu-22.04'},
+            {'name': 'custom', 'instance_type': 't3.medium', 'image': {'image_id': 'ami-0123456789abcdef0', 'image_user': 'ubuntu'}},
+        ],
+    })
+
+    report = validate_config_file(config_path)
+    assert report.errors == []
+
+    config = ClassConfig.load(config_path)
+    assert [r.name for r in config.resources] == ['machine', 'custom']
+    assert config.resources[0].init_scripts == []
+    assert config.resources[0].post_launch_scripts == []
+    assert config.resources[0].webview_links == []
+    assert config.description == []
+
+
+def test_missing_script_is_reported(tmp_path):
+    config_path = _write_config(tmp_path, {
+        'id': 'class-id',
+        'name': 'Training',
+        'presentations': [{'file': 'pdf/Slides.pdf', 'notes_source': None}],
+        'resources': [{'name': 'machine', 'instance_type': 't3.medium', 'image': 'ubuntu-22.04', 'init_scripts': ['init.sh']}],
+    })
+
+    report = validate_config_file(config_path)
+    assert any('init_scripts' in e for e in report.errors)
+
+
+def test_published_schema_is_the_packaged_one():
+    assert PUBLISHED_SCHEMA.read_bytes() == PACKAGED_SCHEMA.read_bytes(), "Copy src/strigo/configs/strigo.schema.json to strigo.schema.json"
@@ -0,0 +1,35 @@
+# coding: utf8
+import argparse
+import json
+from pathlib import Path
+
+import ztraining2strigo
+from strigo.configs.classes import ClassConfig
+
+
+class _Class:
+    id = 'class-id'
+
+
+def test_slides_added_to_the_listing_are_watched(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'Slides').mkdir()
+    (tmp_path / 'Slides' / 'slides.json').write_text(json.dumps(['00_intro.md']))
+    config_path = tmp_path / 'strigo.json'
+    config_path.write_text(json.dumps({'id': 'class-id', 'name': 'Training', 'presentations': [{'file': 'pdf/Slides.pdf'}], 'resources': []}))
+    monkeypatch.setattr(ztraining2strigo, '_to_strigo', lambda *args, **kwargs: _Class())
+    monkeypatch.setattr(ztraining2strigo, '_load_config', ClassConfig.load)
+    watched = []
+
+    def watch_changes(get_paths, debounce):
+        watched.append(set(get_paths()))
+        (tmp_path / 'Slides' / 'slides.json').write_text(json.dumps(['00_intro.md', '10_chapter.md']))
+        yield {Path('Slides/slides.json')}
+        watched.append(set(get_paths()))
+        raise KeyboardInterrupt()
+
+    monkeypatch.setattr(ztraining2strigo, 'watch_changes', watch_changes)
+    ztraining2strigo.watch(None, argparse.Namespace(config=config_path, dry_run=False, diff=False, local_jobs=1, debounce=0))
+
+    assert Path('Slides/10_chapter.md') not in watched[0]
+    assert Path('Slides/10_chapter.md') in watched[1]